@@ -1,25 +1,103 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from dotenv import load_dotenv
-import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from .core import settings
+import asyncio
+import threading
 
-load_dotenv()  
-
-SECRET_KEY = os.getenv("SECRET_KEY")
+SECRET_KEY = settings.secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+MAX_BCRYPT_BYTES = 72  # bcrypt only looks at the first 72 bytes
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool so a burst of logins cannot
+    take over the request thread pool that serves every other sync endpoint.
+    bcrypt releases the GIL, so threads give real parallelism here.
+
+    At most `workers` hashes run at once and `max_queue` more may wait; past
+    that, callers get a 503 instead of piling up. With `workers=0` hashing
+    runs on the calling thread (the old behaviour).
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt") if workers else None
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self.rejected = 0
+
+    def _submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        return self._submit(fn, *args).result()
+
+    async def _run_async(self, fn, *args):
+        if self._executor is None:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self._run(_verify, password, hashed_password)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async(_hash, password)
+
+    async def verify_and_update_async(self, password: str, hashed_password: str):
+        """
+        Returns (valid, new_hash). new_hash is set when the stored hash was
+        made with a different work factor and should be replaced.
+        """
+        return await self._run_async(_verify_and_update, password, hashed_password)
+
+
+def _encode(password: str) -> bytes:
+    return password.encode("utf-8")[:MAX_BCRYPT_BYTES]
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(_encode(password))
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(_encode(password), hashed_password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(_encode(password), hashed_password)
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_queue)
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
+def create_access_token(data: dict, expires_delta: timedelta = None, token_version: int = None):
     to_encode = data.copy()
+    if token_version is not None:
+        to_encode["ver"] = token_version
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
@@ -0,0 +1,255 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+from pydantic import TypeAdapter
+from .core import settings
+
+
+class _Flight:
+    """A load in progress that concurrent misses for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[bytes] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    """
+    In-process cache of serialized response bodies.
+
+    Entries are bytes keyed by route + parameters, expire after a TTL and are
+    evicted least-recently-used once `max_entries` is reached. Every entry is
+    labelled with tags (e.g. "blogs:list", "blog:my-slug") so write paths can
+    drop exactly the entries they affect. Misses are single-flight: while one
+    thread loads a key, other requests for it wait for that result instead of
+    hitting the database themselves.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0, enabled: bool = True, replica_lag: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        # Replica reads this soon after an invalidation may predate the write, so they aren't stored
+        self.replica_lag = replica_lag
+        self._invalidated_at = float("-inf")
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.replica_skips = 0
+
+    def get_or_set(
+        self, key: str, loader: Callable[[], bytes], tags: Iterable[str] = (), replica: bool = False
+    ) -> bytes:
+        """
+        The cached body for `key`, calling `loader` on a miss. Pass
+        `replica=True` when the loader reads from a replica: its result is
+        then returned but not stored if it may be older than the last
+        invalidation.
+        """
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            body = self._lookup(key)
+            if body is not None:
+                return body
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            body = loader()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        else:
+            flight.value = body
+            with self._lock:
+                if self._storable(generation, replica):
+                    self._store(key, body, tags)
+            return body
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def aget_or_set(
+        self, key: str, loader: Callable[[], Awaitable[bytes]], tags: Iterable[str] = (), replica: bool = False
+    ) -> bytes:
+        """
+        Same as get_or_set for async handlers: concurrent misses await the
+        leader's future instead of blocking a thread. The leader loads with
+        its own request's session, so if that request is cancelled (e.g. the
+        client went away) the load stops and a waiting request takes over
+        with its own loader instead of failing too.
+        """
+        if not self.enabled:
+            return await loader()
+
+        counted = False
+        while True:
+            with self._lock:
+                body = self._lookup(key)
+                if body is not None:
+                    return body
+                if not counted:
+                    self.misses += 1
+                    counted = True
+                flight = self._async_flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                    generation = self._generation
+            if leader:
+                break
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                # Only the leader was cancelled, not this request: try again, as the new leader if nobody else is
+                if flight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        try:
+            body = await loader()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            # Mark retrieved so an unawaited failure is not logged as "never retrieved"
+            flight.exception()
+            raise
+        else:
+            flight.set_result(body)
+            with self._lock:
+                if self._storable(generation, replica):
+                    self._store(key, body, tags)
+            return body
+        finally:
+            with self._lock:
+                self._async_flights.pop(key, None)
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at = time.monotonic()
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at = time.monotonic()
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "replica_skips": self.replica_skips,
+            }
+
+    # The helpers below expect self._lock to be held
+    def _storable(self, generation: int, replica: bool) -> bool:
+        if generation != self._generation:
+            return False
+        if replica and time.monotonic() - self._invalidated_at < self.replica_lag:
+            self.replica_skips += 1
+            return False
+        return True
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        body, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def _store(self, key: str, body: bytes, tags: Iterable[str]):
+        if key in self._entries:
+            self._remove(key)
+        tags = frozenset(tags)
+        self._entries[key] = (body, time.monotonic() + self.ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def make_key(route: str, **params) -> str:
+    return route + "?" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+def adapter(schema: Any) -> TypeAdapter:
+    found = _adapters.get(schema)
+    if found is None:
+        found = _adapters[schema] = TypeAdapter(schema)
+    return found
+
+def render(schema: Any, data: Any) -> bytes:
+    """
+    Validate ORM data against a response schema and return the JSON bytes,
+    the same output FastAPI would produce for that response_model.
+    """
+    schema_adapter = adapter(schema)
+    return schema_adapter.dump_json(schema_adapter.validate_python(data, from_attributes=True))
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl=settings.response_cache_ttl_seconds,
+    enabled=settings.response_cache_enabled,
+    replica_lag=settings.replica_sticky_seconds,
+)
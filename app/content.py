@@ -0,0 +1,72 @@
+import math
+import re
+
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_MARKUP_RE = re.compile(r"[#>*_`~|]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def plain_text(content: str) -> str:
+    """
+    Strip HTML tags and the common Markdown markup from blog content.
+    """
+    text = _TAG_RE.sub(" ", content or "")
+    text = _IMAGE_RE.sub(" ", text)
+    text = _LINK_RE.sub(r"\1", text)
+    text = _MARKUP_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def summarize(content: str) -> dict:
+    """
+    Excerpt, word count and reading time for a blog body, stored on the row
+    so list queries can leave `content` unloaded.
+    """
+    text = plain_text(content)
+    word_count = len(text.split())
+    excerpt = text
+    if len(text) > EXCERPT_LENGTH:
+        excerpt = text[:EXCERPT_LENGTH].rsplit(" ", 1)[0].rstrip(",.;:") + "…"
+    return {
+        "excerpt": excerpt,
+        "word_count": word_count,
+        "reading_time_minutes": max(1, math.ceil(word_count / WORDS_PER_MINUTE)),
+    }
+
+
+def backfill(db, batch_size: int = 500) -> int:
+    """
+    Fill excerpt, word_count and reading_time_minutes for blogs written
+    before those columns existed (excerpt NULL); returns how many were updated.
+    """
+    from sqlalchemy import bindparam, select, update
+    from . import models
+
+    blogs = models.Blog.__table__
+    statement = (
+        update(blogs)
+        .where(blogs.c.id == bindparam("blog_id"), blogs.c.excerpt.is_(None))
+        .values(excerpt=bindparam("new_excerpt"), word_count=bindparam("words"), reading_time_minutes=bindparam("minutes"))
+    )
+    updated = 0
+    last_id = 0
+    while True:
+        page = db.execute(
+            select(blogs.c.id, blogs.c.content)
+            .where(blogs.c.id > last_id, blogs.c.excerpt.is_(None)).order_by(blogs.c.id).limit(batch_size)
+        ).all()
+        if not page:
+            return updated
+        last_id = page[-1].id
+        summaries = [summarize(row.content) for row in page]
+        db.execute(statement, [
+            {"blog_id": row.id, "new_excerpt": summary["excerpt"], "words": summary["word_count"], "minutes": summary["reading_time_minutes"]}
+            for row, summary in zip(page, summaries)
+        ])
+        db.commit()
+        updated += len(page)
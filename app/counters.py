@@ -0,0 +1,162 @@
+"""
+Dashboard counters kept in the `counters` table.
+
+The crud write paths bump them in the same transaction as the row they
+change, so the dashboard reads stored numbers instead of running COUNT(*)
+over growing tables. `reconcile` recomputes everything from the tables
+and corrects any drift, for example after rows were changed outside crud:
+
+    python -m app.counters
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+
+USERS = "users"
+CATEGORIES = "categories"
+TAGS = "tags"
+# Set by reconcile(); until it exists the stored counts can't be trusted and read() counts the tables
+RECONCILED = "reconciled_at"
+
+# (status, category_id, author_id) of a blog, as far as the counters are concerned
+BlogKey = Tuple[str, Optional[int], Optional[int]]
+
+
+def blog_key(blog) -> BlogKey:
+    return blog.status, blog.category_id, blog.author_id
+
+
+def _blog_counter_names(key: BlogKey):
+    status, category_id, author_id = key
+    names = [f"blogs:{status}"]
+    if category_id is not None:
+        names.append(f"blogs:{status}:category:{category_id}")
+    if author_id is not None:
+        names.append(f"blogs:{status}:author:{author_id}")
+    return names
+
+
+def bump(db: Session, name: str, delta: int = 1):
+    """Add `delta` to a counter inside the caller's transaction (committed with it)."""
+    if delta == 0:
+        return
+    counters = models.Counter.__table__
+    # A relative UPDATE is atomic across workers; the row lock is held until the caller commits
+    result = db.execute(update(counters).where(counters.c.name == name).values(value=counters.c.value + delta))
+    if result.rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(counters.insert().values(name=name, value=delta))
+    except IntegrityError:
+        # Another transaction created the row first
+        db.execute(update(counters).where(counters.c.name == name).values(value=counters.c.value + delta))
+
+
+def add_blog(db: Session, key: BlogKey, delta: int = 1):
+    for name in _blog_counter_names(key):
+        bump(db, name, delta)
+
+
+def move_blog(db: Session, old: BlogKey, new: BlogKey):
+    """Apply a blog's status/category/author change, e.g. draft -> published moves one count."""
+    if old == new:
+        return
+    old_names, new_names = set(_blog_counter_names(old)), set(_blog_counter_names(new))
+    for name in old_names - new_names:
+        bump(db, name, -1)
+    for name in new_names - old_names:
+        bump(db, name, 1)
+
+
+def forget(db: Session, pattern: str):
+    """Drop per-category or per-author counters, e.g. when the category itself is deleted."""
+    counters = models.Counter.__table__
+    db.execute(counters.delete().where(counters.c.name.like(pattern)))
+
+
+def read(db: Session) -> Dict[str, int]:
+    counters = models.Counter.__table__
+    values = dict(db.execute(select(counters.c.name, counters.c.value)).all())
+    if RECONCILED not in values:
+        # Never reconciled (e.g. just deployed): count from the tables without writing,
+        # since dashboard reads may be on a read replica
+        return _actual(db)
+    return values
+
+
+def _actual(db: Session) -> Dict[str, int]:
+    """Every counter, recomputed from the tables."""
+    values: Dict[str, int] = defaultdict(int)
+    totals = db.execute(select(
+        select(func.count()).select_from(models.User).scalar_subquery(),
+        select(func.count()).select_from(models.BlogCategory).scalar_subquery(),
+        select(func.count()).select_from(models.BlogTag).scalar_subquery(),
+    )).one()
+    values[USERS], values[CATEGORIES], values[TAGS] = totals
+    # One aggregate pass over blogs yields the status, per-category and per-author counts
+    grouped = db.execute(
+        select(models.Blog.status, models.Blog.category_id, models.Blog.author_id, func.count())
+        .group_by(models.Blog.status, models.Blog.category_id, models.Blog.author_id)
+    )
+    for status, category_id, author_id, count in grouped:
+        for name in _blog_counter_names((status, category_id, author_id)):
+            values[name] += count
+    for status in ("draft", "published"):
+        values.setdefault(f"blogs:{status}", 0)
+    return values
+
+
+def reconcile(db: Session) -> Dict[str, Tuple[Optional[int], int]]:
+    """
+    Recompute every counter and overwrite the stored values that drifted.
+
+    Returns {name: (stored, actual)} for each counter that was corrected.
+    The stored rows are locked first (FOR UPDATE, where supported), so crud
+    writes that commit during the recount wait and then apply on top of
+    the corrected value instead of being lost.
+    """
+    counters = models.Counter.__table__
+    stored = dict(db.execute(select(counters.c.name, counters.c.value).with_for_update()).all())
+    actual = _actual(db)
+    drift = {}
+    for name in set(stored) | set(actual):
+        if name == RECONCILED:
+            continue
+        if stored.get(name) != actual.get(name, 0):
+            drift[name] = (stored.get(name), actual.get(name, 0))
+    for name, (before, value) in drift.items():
+        if before is None:
+            db.execute(counters.insert().values(name=name, value=value))
+        elif value == 0 and name.count(":") > 1:
+            db.execute(counters.delete().where(counters.c.name == name))
+        else:
+            db.execute(update(counters).where(counters.c.name == name).values(value=value))
+    reconciled_at = int(datetime.now(timezone.utc).timestamp())
+    if RECONCILED in stored:
+        db.execute(update(counters).where(counters.c.name == RECONCILED).values(value=reconciled_at))
+    else:
+        db.execute(counters.insert().values(name=RECONCILED, value=reconciled_at))
+    db.commit()
+    return drift
+
+
+def main():
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        drift = reconcile(db)
+    finally:
+        db.close()
+    for name, (before, value) in sorted(drift.items()):
+        print(f"{name}: {before} -> {value}")
+    print(f"{len(drift)} counters corrected")
+
+
+if __name__ == "__main__":
+    main()
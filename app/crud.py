@@ -1,8 +1,17 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.orm import Session, joinedload, selectinload, defer
+from typing import List, Optional
 from . import models, schemas
 from .auth import hash_password
-import os
-from fastapi import HTTPException
+from .cache import response_cache
+from .database import SessionLocal
+from .replicas import is_replica
+from .content import summarize
+from .rendering import content_hash, render_content
+from .search import search_index, make_snippet
+from .facets import facet_index
+from .principals import principal_cache
+from . import counters
 
 def get_user(db: Session, user_id: int):
     # Eagerly load the user's role to prevent extra database queries
@@ -14,8 +23,16 @@ def get_user_by_email(db: Session, email: str):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).options(joinedload(models.User.role)).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_pw = hash_password(user.password)
+def get_users_after(db: Session, after_id: Optional[int] = None, limit: int = 100):
+    # Keyset page ordered by primary key; fetches limit + 1 rows so the caller can tell if there is a next page
+    query = db.query(models.User).options(joinedload(models.User.role))
+    if after_id is not None:
+        query = query.filter(models.User.id > after_id)
+    return query.order_by(models.User.id.asc()).limit(limit + 1).all()
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    # Callers on the async path hash beforehand so bcrypt does not run on a request thread
+    hashed_pw = hashed_password or hash_password(user.password)
     db_user = models.User(
         email=user.email,
         name=user.name,
@@ -24,6 +41,7 @@ def create_user(db: Session, user: schemas.UserCreate):
         role_id=user.role_id
     )
     db.add(db_user)
+    counters.bump(db, counters.USERS)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -35,17 +53,34 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     update_data = user_update.dict(exclude_unset=True)
     if 'password' in update_data:
         update_data['hashed_password'] = hash_password(update_data.pop('password'))
+    # Password, activation or role changes revoke tokens issued before them
+    if any(key in update_data for key in ('hashed_password', 'is_active', 'role_id')):
+        db_user.token_version = (db_user.token_version or 0) + 1
     for key, value in update_data.items():
         setattr(db_user, key, value)
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(user_id)
+    # Blog responses embed the author
+    response_cache.invalidate("blogs")
+    return db_user
+
+def update_password_hash(db: Session, db_user: models.User, hashed_password: str):
+    # Same password, new work factor: tokens stay valid, so token_version is left alone
+    db_user.hashed_password = hashed_password
+    db.commit()
     return db_user
 
 def delete_user(db: Session, user_id: int):
     db_user = get_user(db, user_id)
     if db_user:
         db.delete(db_user)
+        counters.bump(db, counters.USERS, -1)
+        # Their posts are kept with no author
+        counters.forget(db, f"blogs:%:author:{user_id}")
         db.commit()
+        principal_cache.invalidate(user_id)
+        response_cache.invalidate("blogs")
     return db_user
 
 
@@ -63,11 +98,24 @@ def create_role(db: Session, role: schemas.RoleCreate):
     db.refresh(db_role)
     return db_role
 
+def update_role(db: Session, role_id: int, role_update: schemas.RoleUpdate):
+    db_role = get_role(db, role_id)
+    if not db_role:
+        return None
+    update_data = role_update.dict(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(db_role, key, value)
+    db.commit()
+    db.refresh(db_role)
+    principal_cache.invalidate_role(role_id)
+    return db_role
+
 def delete_role(db: Session, role_id: int):
     db_role = get_role(db, role_id)
     if db_role:
         db.delete(db_role)
         db.commit()
+        principal_cache.invalidate_role(role_id)
     return db_role
 
 
@@ -82,6 +130,7 @@ def create_category(db: Session, category: schemas.CategoryCreate):
     # Using **category.dict() unpacks all fields from the form (name and description)
     db_category = models.BlogCategory(**category.dict())
     db.add(db_category)
+    counters.bump(db, counters.CATEGORIES)
     db.commit()
     db.refresh(db_category)
     return db_category
@@ -99,6 +148,7 @@ def create_tag(db: Session, tag: schemas.TagCreate):
     # Using **tag.dict() unpacks all fields from the form
     db_tag = models.BlogTag(**tag.dict())
     db.add(db_tag)
+    counters.bump(db, counters.TAGS)
     db.commit()
     db.refresh(db_tag)
     return db_tag
@@ -111,7 +161,7 @@ def create_blog(db: Session, blog: schemas.BlogCreate, author_id: int):
     blog_data = blog.dict(exclude={'tag_ids'})
     
     
-    db_blog = models.Blog(**blog_data, author_id=author_id)
+    db_blog = models.Blog(**blog_data, **summarize(blog.content), **render_content(blog.content), author_id=author_id)
     
     
     if tag_ids:
@@ -119,8 +169,14 @@ def create_blog(db: Session, blog: schemas.BlogCreate, author_id: int):
         db_blog.tags = tags  # Assign the list of Tag objects
         
     db.add(db_blog)
+    # Flushed first so the column default for status is applied before it is counted
+    db.flush()
+    counters.add_blog(db, counters.blog_key(db_blog))
     db.commit()
     db.refresh(db_blog)
+    response_cache.invalidate("blogs:list")
+    search_index.index_blog(db_blog)
+    facet_index.index_blog(db_blog)
     return db_blog
 
 def get_blog(db: Session, blog_id: int):
@@ -143,12 +199,113 @@ def get_blog_by_slug(db: Session, slug: str):
     ).first()
 
 def get_blogs(db: Session, skip: int = 0, limit: int = 100):
-    
+    # Newest first, like the cursor and filtered pages, so an offset page is stable across requests.
+    # selectinload for the tags collection so LIMIT applies to blogs directly instead of a wrapped subquery
     return db.query(models.Blog).options(
+        defer(models.Blog.content),
+        defer(models.Blog.content_html),
+        defer(models.Blog.toc),
         joinedload(models.Blog.author),
         joinedload(models.Blog.category),
-        joinedload(models.Blog.tags)
-    ).filter(models.Blog.status == 'published').offset(skip).limit(limit).all()
+        selectinload(models.Blog.tags)
+    ).filter(models.Blog.status == 'published').order_by(models.Blog.id.desc()).offset(skip).limit(limit).all()
+
+def get_blogs_after(db: Session, after_id: Optional[int] = None, limit: int = 100):
+    # Keyset page, newest first: "id < last seen id" uses the primary key index no matter how deep the page is
+    query = db.query(models.Blog).options(
+        defer(models.Blog.content),
+        defer(models.Blog.content_html),
+        defer(models.Blog.toc),
+        joinedload(models.Blog.author),
+        joinedload(models.Blog.category),
+        selectinload(models.Blog.tags)
+    ).filter(models.Blog.status == 'published')
+    if after_id is not None:
+        query = query.filter(models.Blog.id < after_id)
+    return query.order_by(models.Blog.id.desc()).limit(limit + 1).all()
+
+
+def _ensure_index(index, db: Session):
+    # The indexes are shared by every request in the worker, so build them from the primary, not a lagging replica
+    if index.loaded:
+        return
+    if not is_replica(db):
+        index.ensure_loaded(db)
+        return
+    with SessionLocal() as primary:
+        index.ensure_loaded(primary)
+
+def get_blogs_filtered(
+    db: Session,
+    tag_ids: List[int],
+    category_id: Optional[int] = None,
+    match_all: bool = True,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+):
+    # The facet index resolves the filter and the page of ids in memory; the DB only loads that page
+    _ensure_index(facet_index, db)
+    matched = facet_index.match(tag_ids, category_id, match_all)
+    ids = facet_index.page(matched, skip=skip, limit=limit, before_id=after_id)
+    if not ids:
+        return []
+    blogs = db.query(models.Blog).options(
+        defer(models.Blog.content),
+        defer(models.Blog.content_html),
+        defer(models.Blog.toc),
+        joinedload(models.Blog.author),
+        joinedload(models.Blog.category),
+        selectinload(models.Blog.tags)
+    ).filter(models.Blog.id.in_(ids)).all()
+    by_id = {blog.id: blog for blog in blogs}
+    return [by_id[blog_id] for blog_id in ids if blog_id in by_id]
+
+def get_blog_facets(db: Session, tag_ids: List[int], category_id: Optional[int] = None, match_all: bool = True):
+    _ensure_index(facet_index, db)
+    counts = facet_index.counts(tag_ids, category_id, match_all)
+    tags = db.query(models.BlogTag.id, models.BlogTag.name).order_by(models.BlogTag.name).all()
+    categories = db.query(models.BlogCategory.id, models.BlogCategory.name).order_by(models.BlogCategory.name).all()
+    return {
+        "total": counts["total"],
+        "tags": [{"id": id, "name": name, "count": counts["tags"].get(id, 0)} for id, name in tags],
+        "categories": [
+            {"id": id, "name": name, "count": counts["categories"].get(id, 0)} for id, name in categories
+        ],
+    }
+
+def search_blogs(db: Session, q: str, skip: int = 0, limit: int = 20):
+    _ensure_index(search_index, db)
+    # The index can lag behind other workers' writes. Over-fetch the page and keep only the hits
+    # still published; `total` is the index's count less the hits dropped from this window.
+    total, ranked = search_index.search(q, skip=skip, limit=2 * limit)
+    if not ranked:
+        return {"total": total, "items": []}
+    window = [blog_id for blog_id, _ in ranked]
+    published = {
+        blog_id for blog_id, in db.query(models.Blog.id).filter(
+            models.Blog.id.in_(window), models.Blog.status == 'published'
+        )
+    }
+    stale = [blog_id for blog_id in window if blog_id not in published]
+    if not is_replica(db):
+        # A replica may not have a just-published post yet; only the primary is trusted to prune the index
+        for blog_id in stale:
+            search_index.remove_blog(blog_id)
+    ranked = [(blog_id, score) for blog_id, score in ranked if blog_id in published][:limit]
+    blogs = db.query(models.Blog).options(
+        defer(models.Blog.content_html),
+        defer(models.Blog.toc),
+        joinedload(models.Blog.author),
+        joinedload(models.Blog.category),
+        selectinload(models.Blog.tags)
+    ).filter(models.Blog.id.in_([blog_id for blog_id, _ in ranked])).all()
+    by_id = {blog.id: blog for blog in blogs}
+    items = [
+        {"blog": by_id[blog_id], "score": round(score, 4), "snippet": make_snippet(by_id[blog_id].content, q)}
+        for blog_id, score in ranked if blog_id in by_id
+    ]
+    return {"total": total - len(stale), "items": items}
 
 
 def get_blogs_by_author(db: Session, author_id: int):
@@ -158,59 +315,104 @@ def get_blogs_by_author(db: Session, author_id: int):
         joinedload(models.Blog.tags)
     ).filter(models.Blog.author_id == author_id).order_by(models.Blog.id.desc()).all()
 
+def sync_blog_tags(db: Session, db_blog: models.Blog, tag_ids: List[int]):
+    """
+    Make the blog's tags exactly `tag_ids` (unknown ids are ignored), touching
+    only the association rows that change: one DELETE for the removed tags
+    and one executemany INSERT for the added ones.
+    """
+    links = models.blog_tag_association
+    current = set(db.execute(select(links.c.tag_id).where(links.c.blog_id == db_blog.id)).scalars())
+    added = set(tag_ids) - current
+    if added:
+        added = set(db.execute(select(models.BlogTag.id).where(models.BlogTag.id.in_(added))).scalars())
+    removed = current - set(tag_ids)
+    if removed:
+        db.execute(delete(links).where(links.c.blog_id == db_blog.id, links.c.tag_id.in_(removed)))
+    if added:
+        db.execute(links.insert(), [{"blog_id": db_blog.id, "tag_id": tag_id} for tag_id in sorted(added)])
+    if added or removed:
+        # The loaded collection no longer matches the table
+        db.expire(db_blog, ["tags"])
+
 def update_blog(db: Session, blog_id: int, blog_update: schemas.BlogUpdate):
     db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
     if not db_blog:
         return None
 
     update_data = blog_update.dict(exclude_unset=True)
-    
+    counted_as = counters.blog_key(db_blog)
+    # A renamed slug must also drop the cached response under the old one
+    old_slug = db_blog.slug
 
     if 'tag_ids' in update_data:
         tag_ids = update_data.pop('tag_ids')
         if tag_ids is not None:
-            tags = db.query(models.BlogTag).filter(models.BlogTag.id.in_(tag_ids)).all()
-            db_blog.tags = tags
+            sync_blog_tags(db, db_blog, tag_ids)
+
+    if update_data.get('content') is not None:
+        update_data.update(summarize(update_data['content']))
+        # Only re-render when the content (or the renderer) actually changed
+        if db_blog.content_hash != content_hash(update_data['content']):
+            update_data.update(render_content(update_data['content']))
 
     # Update remaining fields
     for key, value in update_data.items():
         setattr(db_blog, key, value)
-        
+
+    counters.move_blog(db, counted_as, counters.blog_key(db_blog))
     db.commit()
     db.refresh(db_blog)
+    response_cache.invalidate("blogs:list", f"blog:{old_slug}", f"blog:{db_blog.slug}")
+    search_index.index_blog(db_blog)
+    facet_index.index_blog(db_blog)
     return db_blog
 
 def delete_blog(db: Session, blog_id: int):
     db_blog = db.query(models.Blog).filter(models.Blog.id == blog_id).first()
     
     if db_blog:
-        # Delete associated image file if it exists
-        if db_blog.image_url:
-            file_path = db_blog.image_url.lstrip("/")  # convert URL to filesystem path
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=f"Failed to delete image file: {e}")
-        
+        # The image file may be shared with other blogs or projects; upload_gc reclaims it once unreferenced
         # Delete the blog record from the database
         db.delete(db_blog)
+        counters.add_blog(db, counters.blog_key(db_blog), -1)
         db.commit()
+        response_cache.invalidate("blogs:list", f"blog:{db_blog.slug}")
+        search_index.remove_blog(db_blog.id)
+        facet_index.remove_blog(db_blog.id)
     
     return db_blog
 
 def get_dashboard_stats(db: Session):
-    total_users = db.query(models.User).count()
-    published_blogs = db.query(models.Blog).filter(models.Blog.status == 'published').count()
-    draft_blogs = db.query(models.Blog).filter(models.Blog.status == 'draft').count()
-    total_categories = db.query(models.BlogCategory).count()
-    total_tags = db.query(models.BlogTag).count()
+    # Maintained by the write paths (see counters.py) instead of COUNT(*) per request
+    values = counters.read(db)
+    by_category, by_author = {}, {}
+    for name, value in values.items():
+        parts = name.split(":")
+        if len(parts) == 4 and parts[0] == "blogs" and value:
+            _, status, kind, owner_id = parts
+            groups = by_category if kind == "category" else by_author
+            groups.setdefault(int(owner_id), {})[status] = value
+    category_names = dict(
+        db.query(models.BlogCategory.id, models.BlogCategory.name).filter(models.BlogCategory.id.in_(by_category)).all()
+    ) if by_category else {}
+    author_names = dict(
+        db.query(models.User.id, models.User.name).filter(models.User.id.in_(by_author)).all()
+    ) if by_author else {}
     return schemas.DashboardStats(
-        total_users=total_users,
-        published_blogs=published_blogs,
-        draft_blogs=draft_blogs,
-        total_categories=total_categories,
-        total_tags=total_tags
+        total_users=values.get(counters.USERS, 0),
+        published_blogs=values.get("blogs:published", 0),
+        draft_blogs=values.get("blogs:draft", 0),
+        total_categories=values.get(counters.CATEGORIES, 0),
+        total_tags=values.get(counters.TAGS, 0),
+        posts_by_category=[
+            schemas.CategoryPostCount(category_id=category_id, name=category_names.get(category_id), **counts)
+            for category_id, counts in sorted(by_category.items())
+        ],
+        posts_by_author=[
+            schemas.AuthorPostCount(author_id=author_id, name=author_names.get(author_id), **counts)
+            for author_id, counts in sorted(by_author.items())
+        ],
     )
 
 def update_category(db: Session, category_id: int, category_update: schemas.CategoryCreate):
@@ -222,13 +424,19 @@ def update_category(db: Session, category_id: int, category_update: schemas.Cate
         setattr(db_category, key, value)
     db.commit()
     db.refresh(db_category)
+    response_cache.invalidate("blogs")
     return db_category
 
 def delete_category(db: Session, category_id: int):
     db_category = get_category(db, category_id)
     if db_category:
         db.delete(db_category)
+        counters.bump(db, counters.CATEGORIES, -1)
+        # Its posts are kept, uncategorized
+        counters.forget(db, f"blogs:%:category:{category_id}")
         db.commit()
+        response_cache.invalidate("blogs")
+        facet_index.remove_category(category_id)
     return db_category
 
 # === UPDATE Blog Tag CRUD Functions ===
@@ -241,13 +449,20 @@ def update_tag(db: Session, tag_id: int, tag_update: schemas.TagCreate):
         setattr(db_tag, key, value)
     db.commit()
     db.refresh(db_tag)
+    response_cache.invalidate("blogs")
+    # Tag names are indexed with every post that carries them
+    search_index.reset()
     return db_tag
 
 def delete_tag(db: Session, tag_id: int):
     db_tag = get_tag(db, tag_id)
     if db_tag:
         db.delete(db_tag)
+        counters.bump(db, counters.TAGS, -1)
         db.commit()
+        response_cache.invalidate("blogs")
+        search_index.reset()
+        facet_index.remove_tag(tag_id)
     return db_tag
 
 def get_all_blogs_for_dashboard(db: Session, skip: int = 0, limit: int = 100):
@@ -263,7 +478,13 @@ def get_project(db: Session, project_id: int):
     return db.query(models.Project).options(joinedload(models.Project.images)).filter(models.Project.id == project_id).first()
 
 def get_projects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).options(joinedload(models.Project.images)).order_by(models.Project.id.desc()).offset(skip).limit(limit).all()
+    return db.query(models.Project).options(selectinload(models.Project.images)).order_by(models.Project.id.desc()).offset(skip).limit(limit).all()
+
+def get_projects_after(db: Session, after_id: Optional[int] = None, limit: int = 100):
+    query = db.query(models.Project).options(selectinload(models.Project.images))
+    if after_id is not None:
+        query = query.filter(models.Project.id < after_id)
+    return query.order_by(models.Project.id.desc()).limit(limit + 1).all()
 
 def create_project(db: Session, project: schemas.ProjectCreate):
 
@@ -272,19 +493,55 @@ def create_project(db: Session, project: schemas.ProjectCreate):
     
 
     db_project = models.Project(**project_data)
+    # Gallery rows go in with the project: one flush and commit, one refresh
+    db_project.images = [models.ProjectImage(url=url, position=position) for position, url in enumerate(gallery_urls or [])]
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
-
-    if gallery_urls:
-        for url in gallery_urls:
-            db_image = models.ProjectImage(url=url, project_id=db_project.id)
-            db.add(db_image)
-        db.commit()
-        db.refresh(db_project)
     
+    response_cache.invalidate("projects:list")
     return db_project
 
+def sync_gallery(db: Session, db_project: models.Project, urls: List[str]):
+    """
+    Make the project's gallery exactly `urls`, in that order, with at most
+    three bulk statements: DELETE the rows whose URL was dropped, INSERT the
+    new URLs, and UPDATE the position of kept rows that moved. Appending an
+    image is a single INSERT.
+    """
+    images = models.ProjectImage.__table__
+    existing = db.execute(
+        select(images.c.id, images.c.url, images.c.position)
+        .where(images.c.project_id == db_project.id)
+        .order_by(images.c.position, images.c.id)
+    ).all()
+    # Match wanted URLs to existing rows by URL (repeats pair up in order)
+    unmatched = {}
+    for row in existing:
+        unmatched.setdefault(row.url, []).append(row)
+    added, moved = [], []
+    for position, url in enumerate(urls):
+        rows = unmatched.get(url)
+        if rows:
+            row = rows.pop(0)
+            if row.position != position:
+                moved.append({"image_id": row.id, "new_position": position})
+        else:
+            added.append({"project_id": db_project.id, "url": url, "position": position})
+    removed = [row.id for rows in unmatched.values() for row in rows]
+
+    if removed:
+        db.execute(delete(images).where(images.c.id.in_(removed)))
+    if moved:
+        db.execute(
+            update(images).where(images.c.id == bindparam("image_id")).values(position=bindparam("new_position")),
+            moved,
+        )
+    if added:
+        db.execute(images.insert(), added)
+    if removed or moved or added:
+        db.expire(db_project, ["images"])
+
 def update_project(db: Session, project_id: int, project_update: schemas.ProjectUpdate):
     db_project = get_project(db, project_id)
     if not db_project:
@@ -294,17 +551,15 @@ def update_project(db: Session, project_id: int, project_update: schemas.Project
     
     if 'gallery_urls' in update_data:
         new_urls = update_data.pop('gallery_urls')
-        db.query(models.ProjectImage).filter(models.ProjectImage.project_id == project_id).delete()
-        for url in new_urls:
-            db_image = models.ProjectImage(url=url, project_id=project_id)
-            db.add(db_image)
-
+        if new_urls is not None:
+            sync_gallery(db, db_project, new_urls)
 
     for key, value in update_data.items():
         setattr(db_project, key, value)
 
     db.commit()
     db.refresh(db_project)
+    response_cache.invalidate("projects:list", f"project:{project_id}")
     return db_project
 
 def delete_project(db: Session, project_id: int):
@@ -312,4 +567,5 @@ def delete_project(db: Session, project_id: int):
     if db_project:
         db.delete(db_project)
         db.commit()
-    return db_project
\ No newline at end of file
+        response_cache.invalidate("projects:list", f"project:{project_id}")
+    return db_project
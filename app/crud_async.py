@@ -0,0 +1,114 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload, defer
+from typing import List, Optional
+from . import models
+from .database import AsyncSessionLocal
+from .replicas import is_replica
+from .facets import facet_index
+
+# Async counterparts of the read paths in crud.py, used when settings.db_async is on.
+# Relationships are always loaded eagerly here: a lazy load cannot run on an AsyncSession.
+
+
+async def get_user(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(models.User).options(joinedload(models.User.role)).filter(models.User.id == user_id)
+    )
+    return result.scalars().first()
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.User).options(joinedload(models.User.role)).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_users_after(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    query = select(models.User).options(joinedload(models.User.role))
+    if after_id is not None:
+        query = query.filter(models.User.id > after_id)
+    result = await db.execute(query.order_by(models.User.id.asc()).limit(limit + 1))
+    return result.scalars().all()
+
+
+def _blog_summary_query():
+    return select(models.Blog).options(
+        defer(models.Blog.content),
+        defer(models.Blog.content_html),
+        defer(models.Blog.toc),
+        joinedload(models.Blog.author),
+        joinedload(models.Blog.category),
+        selectinload(models.Blog.tags)
+    )
+
+async def get_blogs(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        _blog_summary_query().filter(models.Blog.status == 'published')
+        .order_by(models.Blog.id.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_blogs_after(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    query = _blog_summary_query().filter(models.Blog.status == 'published')
+    if after_id is not None:
+        query = query.filter(models.Blog.id < after_id)
+    result = await db.execute(query.order_by(models.Blog.id.desc()).limit(limit + 1))
+    return result.scalars().all()
+
+async def get_blogs_filtered(
+    db: AsyncSession,
+    tag_ids: List[int],
+    category_id: Optional[int] = None,
+    match_all: bool = True,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+):
+    if not facet_index.loaded:
+        # Shared by every request in the worker, so built from the primary rather than a lagging replica
+        if is_replica(db):
+            async with AsyncSessionLocal() as primary:
+                await primary.run_sync(facet_index.ensure_loaded)
+        else:
+            await db.run_sync(facet_index.ensure_loaded)
+    matched = facet_index.match(tag_ids, category_id, match_all)
+    ids = facet_index.page(matched, skip=skip, limit=limit, before_id=after_id)
+    if not ids:
+        return []
+    result = await db.execute(_blog_summary_query().filter(models.Blog.id.in_(ids)))
+    by_id = {blog.id: blog for blog in result.scalars().all()}
+    return [by_id[blog_id] for blog_id in ids if blog_id in by_id]
+
+async def get_blog_by_slug(db: AsyncSession, slug: str):
+    result = await db.execute(
+        select(models.Blog).options(
+            joinedload(models.Blog.author),
+            joinedload(models.Blog.category),
+            selectinload(models.Blog.tags)
+        ).filter(
+            models.Blog.slug == slug,
+            models.Blog.status == 'published'
+        )
+    )
+    return result.scalars().first()
+
+
+async def get_project(db: AsyncSession, project_id: int):
+    result = await db.execute(
+        select(models.Project).options(selectinload(models.Project.images)).filter(models.Project.id == project_id)
+    )
+    return result.scalars().first()
+
+async def get_projects(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.Project).options(selectinload(models.Project.images))
+        .order_by(models.Project.id.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_projects_after(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    query = select(models.Project).options(selectinload(models.Project.images))
+    if after_id is not None:
+        query = query.filter(models.Project.id < after_id)
+    result = await db.execute(query.order_by(models.Project.id.desc()).limit(limit + 1))
+    return result.scalars().all()
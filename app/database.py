@@ -1,8 +1,72 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .core import settings  
+from .pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument, pool_options
+from .replicas import Replica, ReplicaRouter
 
-engine = create_engine(settings.database_url)
+# SQLite (local dev, benchmarks) keeps SQLAlchemy's default pool
+POOLED = make_url(settings.database_url).get_backend_name() != "sqlite"
+
+def make_engine(url: str):
+    engine = create_engine(url, **(dict(poolclass=InstrumentedQueuePool, **pool_options(settings)) if POOLED else {}))
+    if POOLED:
+        instrument(engine)
+    return engine
+
+engine = make_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Async drivers for the sync drivers we support, used when ASYNC_DATABASE_URL is not set
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+def make_async_sessionmaker(url: str):
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        url, **(dict(poolclass=InstrumentedAsyncQueuePool, **pool_options(settings)) if POOLED else {})
+    )
+    if POOLED:
+        instrument(async_engine.sync_engine)
+    # expire_on_commit=False: attributes must stay readable after commit without an implicit (sync) refresh
+    return async_engine, async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.db_async:
+    async_engine, AsyncSessionLocal = make_async_sessionmaker(
+        settings.async_database_url or async_database_url(settings.database_url)
+    )
+
+replica_engines = []
+replicas = []
+for index, url in enumerate(settings.database_replica_urls):
+    replica_engine = make_engine(url)
+    replica_engines.append(replica_engine)
+    async_factory = None
+    if settings.db_async:
+        _, async_factory = make_async_sessionmaker(async_database_url(url))
+    replicas.append(Replica(
+        name=f"replica-{index}:{make_url(url).host or make_url(url).database}",
+        session_factory=sessionmaker(autocommit=False, autoflush=False, bind=replica_engine),
+        async_session_factory=async_factory,
+    ))
+replica_router = ReplicaRouter(
+    replicas,
+    strategy=settings.replica_strategy,
+    eject_seconds=settings.replica_eject_seconds,
+    sticky_seconds=settings.replica_sticky_seconds,
+)
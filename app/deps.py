@@ -1,37 +1,110 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy import exc
 from sqlalchemy.orm import Session
-from .database import SessionLocal
-from . import models 
+from .database import SessionLocal, AsyncSessionLocal, replica_router
+from .replicas import is_replica, mark_replica
+from .core import settings
+from . import models, crud, crud_async
 from .auth import SECRET_KEY, ALGORITHM
+from .principals import Principal, principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    # Safe-method requests go to a read replica when any are configured
+    replica = replica_router.route(request)
+    db = replica.session_factory() if replica else SessionLocal()
+    if replica is not None:
+        mark_replica(db, replica)
+    failed = False
     try:
         yield db
+    except exc.DBAPIError as error:
+        failed = replica is not None and (error.connection_invalidated or isinstance(error, exc.OperationalError))
+        raise
     finally:
         db.close()
+        if replica is not None:
+            replica_router.release(replica, failed=failed)
 
-async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+async def get_async_db(request: Request):
+    replica = replica_router.route(request)
+    factory = replica.async_session_factory if replica else AsyncSessionLocal
+    failed = False
+    try:
+        async with factory() as db:
+            if replica is not None:
+                mark_replica(db, replica)
+            yield db
+    except exc.DBAPIError as error:
+        failed = replica is not None and (error.connection_invalidated or isinstance(error, exc.OperationalError))
+        raise
+    finally:
+        if replica is not None:
+            replica_router.release(replica, failed=failed)
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub"))
-        if user_id is None:
-            raise credentials_exception
-    except (JWTError, ValueError):
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    except (JWTError, ValueError, TypeError):
+        raise _credentials_exception()
+    return user_id, payload.get("ver")
+
+def _check_version(principal: Principal, token_version) -> Principal:
+    # Tokens issued before token_version support carry no "ver" and are accepted until they expire
+    if token_version is not None and token_version != principal.token_version:
+        raise _credentials_exception()
+    return principal
+
+# Cached principals authorize writes on the primary too, so never load them from a lagging replica
+def _load_user(db: Session, user_id: int):
+    if not is_replica(db):
+        return crud.get_user(db, user_id)
+    with SessionLocal() as primary:
+        return crud.get_user(primary, user_id)
+
+async def _load_user_async(db, user_id: int):
+    if not is_replica(db):
+        return await crud_async.get_user(db, user_id)
+    async with AsyncSessionLocal() as primary:
+        return await crud_async.get_user(primary, user_id)
+
+# Plain def so FastAPI runs the query in its thread pool instead of on the event loop
+def get_current_user_sync(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    user_id, token_version = _decode_token(token)
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        generation = principal_cache.generation
+        user = _load_user(db, user_id)
+        if user is None:
+            raise _credentials_exception()
+        principal = Principal.from_user(user)
+        principal_cache.put(principal, generation)
+    return _check_version(principal, token_version)
+
+async def get_current_user_async(db=Depends(get_async_db), token: str = Depends(oauth2_scheme)):
+    user_id, token_version = _decode_token(token)
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        generation = principal_cache.generation
+        user = await _load_user_async(db, user_id)
+        if user is None:
+            raise _credentials_exception()
+        principal = Principal.from_user(user)
+        principal_cache.put(principal, generation)
+    return _check_version(principal, token_version)
+
+get_current_user = get_current_user_async if settings.db_async else get_current_user_sync
 
 def get_current_admin(current_user: models.User = Depends(get_current_user)):
     if not current_user.role or current_user.role.name.lower() != "admin":
@@ -39,4 +112,4 @@ def get_current_admin(current_user: models.User = Depends(get_current_user)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions",
         )
-    return current_user
\ No newline at end of file
+    return current_user
@@ -0,0 +1,158 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from . import models
+from .core import settings
+
+
+def _ids_desc(bitmap: int) -> Iterable[int]:
+    """Yield the blog ids set in a bitmap, highest (newest) first."""
+    bits = bin(bitmap)[2:] if bitmap else ""
+    top = len(bits) - 1
+    pos = bits.find("1")
+    while pos != -1:
+        yield top - pos
+        pos = bits.find("1", pos + 1)
+
+
+class FacetIndex:
+    """
+    Posting sets of published blog ids per tag and per category.
+
+    Each set is a Python int used as a bitmap (bit n = blog id n), so AND/OR
+    filters and facet counts are a handful of big-int operations instead of a
+    COUNT query per facet. Loaded from the database on first use, kept current
+    by the blog write paths in crud and rebuilt after
+    `settings.facet_index_max_age_seconds` to pick up other workers' writes.
+    """
+
+    def __init__(self, max_age: float = 0):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.loaded_at: Optional[float] = None
+        self.published = 0
+        self.tags: Dict[int, int] = {}
+        self.categories: Dict[int, int] = {}
+
+    @property
+    def loaded(self) -> bool:
+        if self.loaded_at is None:
+            return False
+        return not self.max_age or time.monotonic() - self.loaded_at < self.max_age
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def ensure_loaded(self, db: Session):
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            self._reset()
+            rows = db.query(models.Blog.id, models.Blog.category_id).filter(models.Blog.status == 'published')
+            for blog_id, category_id in rows.yield_per(5000):
+                bit = 1 << blog_id
+                self.published |= bit
+                if category_id is not None:
+                    self.categories[category_id] = self.categories.get(category_id, 0) | bit
+            links = db.query(models.blog_tag_association.c.blog_id, models.blog_tag_association.c.tag_id).join(
+                models.Blog, models.Blog.id == models.blog_tag_association.c.blog_id
+            ).filter(models.Blog.status == 'published')
+            for blog_id, tag_id in links.yield_per(5000):
+                self.tags[tag_id] = self.tags.get(tag_id, 0) | (1 << blog_id)
+            self.loaded_at = time.monotonic()
+
+    # --- incremental maintenance, called from crud ---
+    def index_blog(self, blog: models.Blog):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._clear(blog.id)
+            if blog.status != 'published':
+                return
+            bit = 1 << blog.id
+            self.published |= bit
+            if blog.category_id is not None:
+                self.categories[blog.category_id] = self.categories.get(blog.category_id, 0) | bit
+            for tag in blog.tags:
+                self.tags[tag.id] = self.tags.get(tag.id, 0) | bit
+
+    def remove_blog(self, blog_id: int):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._clear(blog_id)
+
+    def remove_tag(self, tag_id: int):
+        with self._lock:
+            self.tags.pop(tag_id, None)
+
+    def remove_category(self, category_id: int):
+        with self._lock:
+            self.categories.pop(category_id, None)
+
+    # --- queries ---
+    def match_tags(self, tag_ids: List[int], match_all: bool = True) -> int:
+        if not tag_ids:
+            return self.published
+        sets = [self.tags.get(tag_id, 0) for tag_id in tag_ids]
+        result = sets[0]
+        for bitmap in sets[1:]:
+            result = result & bitmap if match_all else result | bitmap
+        return result
+
+    def match(self, tag_ids: List[int], category_id: Optional[int], match_all: bool = True) -> int:
+        with self._lock:
+            result = self.match_tags(tag_ids, match_all)
+            if category_id is not None:
+                result &= self.categories.get(category_id, 0)
+            return result
+
+    def page(self, bitmap: int, skip: int = 0, limit: int = 100, before_id: Optional[int] = None) -> List[int]:
+        """Blog ids from a result set, newest first, optionally only those below `before_id`."""
+        if before_id is not None:
+            bitmap &= (1 << before_id) - 1
+        ids = []
+        for index, blog_id in enumerate(_ids_desc(bitmap)):
+            if index >= skip + limit:
+                break
+            if index >= skip:
+                ids.append(blog_id)
+        return ids
+
+    def counts(self, tag_ids: List[int], category_id: Optional[int], match_all: bool = True) -> dict:
+        """
+        Facet counts for the current filter. Tag counts are taken within the
+        full filter; category counts ignore the selected category so the
+        other categories still show how many posts they would add.
+        """
+        with self._lock:
+            tag_filtered = self.match_tags(tag_ids, match_all)
+            filtered = tag_filtered
+            if category_id is not None:
+                filtered &= self.categories.get(category_id, 0)
+            return {
+                "total": filtered.bit_count(),
+                "tags": {tag_id: (bitmap & filtered).bit_count() for tag_id, bitmap in self.tags.items()},
+                "categories": {
+                    cat_id: (bitmap & tag_filtered).bit_count() for cat_id, bitmap in self.categories.items()
+                },
+            }
+
+    # Expects self._lock to be held
+    def _clear(self, blog_id: int):
+        mask = ~(1 << blog_id)
+        self.published &= mask
+        for facets in (self.tags, self.categories):
+            for key, bitmap in facets.items():
+                if bitmap >> blog_id & 1:
+                    facets[key] = bitmap & mask
+
+
+facet_index = FacetIndex(max_age=settings.facet_index_max_age_seconds)
@@ -0,0 +1,199 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, UnidentifiedImageError
+from .core import settings
+from .imaging import TransformSpec, derivative_path, render_derivative
+
+
+class DerivativeCache:
+    """
+    Size-capped on-disk LRU of rendered images.
+
+    Recency lives in memory and is rebuilt from file mtimes on first use;
+    hits touch the file so a restart keeps roughly the same order. Other
+    workers share the directory: a file one of them rendered counts as a
+    hit here, and a file one of them evicted is simply rendered again.
+    All methods do file I/O and should be called from the thread pool.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".part"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._bytes += size
+        self._loaded = True
+
+    def lookup(self, path: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                size = os.stat(path).st_size
+                os.utime(path)
+            except FileNotFoundError:
+                self._forget(path)
+                self.misses += 1
+                return False
+            if path not in self._entries:
+                self._bytes += size
+            self._entries[path] = size
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return True
+
+    def add(self, path: str, size: int):
+        with self._lock:
+            self._ensure_loaded()
+            self._forget(path)
+            self._entries[path] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                victim, _ = next(iter(self._entries.items()))
+                self._forget(victim)
+                self.evictions += 1
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+
+    # Expects self._lock to be held
+    def _forget(self, path: str):
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ImageTransformer:
+    """
+    Renders resized/re-encoded images on demand and keeps them in a DerivativeCache.
+
+    Encoding runs in a process pool so it uses every core and never holds
+    the GIL of a request worker. Concurrent requests for the same
+    derivative share one encode. At most `max_pending` distinct encodes are
+    in flight per worker; beyond that requests get a 503.
+    """
+
+    def __init__(self, cache: DerivativeCache, workers: Optional[int] = None, max_pending: int = 32):
+        self.cache = cache
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.encodes = 0
+        self.collapsed = 0
+        self.rejected = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the server process has threads and open connections
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def get(self, source_path: str, spec: TransformSpec) -> str:
+        """Path of the rendered derivative, encoding it first if needed."""
+        source_stat = await run_in_threadpool(os.stat, source_path)
+        path = derivative_path(self.cache.directory, source_path, source_stat, spec)
+        if await run_in_threadpool(self.cache.lookup, path):
+            return path
+
+        task = self._inflight.get(path)
+        if task is None:
+            if len(self._inflight) >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many image transforms in progress, try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            task = asyncio.ensure_future(self._encode(source_path, path, spec))
+            self._inflight[path] = task
+            task.add_done_callback(lambda done: self._finished(path, done))
+        else:
+            self.collapsed += 1
+        # Shielded so a client that disconnects doesn't cancel the encode other requests are waiting on
+        await asyncio.shield(task)
+        return path
+
+    async def _encode(self, source_path: str, path: str, spec: TransformSpec):
+        self.encodes += 1
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(self._pool(), render_derivative, source_path, path, spec)
+        except UnidentifiedImageError:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Source is not a readable image")
+        except Image.DecompressionBombError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Source image has too many pixels to transform")
+        except OSError as error:
+            # Pillow reports truncated or corrupt image data as OSError without an errno;
+            # real I/O failures (e.g. a full disk while writing the derivative) carry one and stay 500s
+            if error.errno is not None:
+                raise
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Source image is truncated or corrupt")
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next request
+            self._executor = None
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Image worker failed, try again")
+        await run_in_threadpool(self.cache.add, path, size)
+
+    def _finished(self, path: str, task: asyncio.Task):
+        self._inflight.pop(path, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here so it isn't logged when every waiter has gone
+
+    def stats(self) -> dict:
+        return dict(
+            self.cache.stats(),
+            encodes=self.encodes,
+            collapsed=self.collapsed,
+            rejected=self.rejected,
+            in_flight=len(self._inflight),
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_transformer = ImageTransformer(
+    DerivativeCache(settings.image_cache_dir, settings.image_cache_max_bytes),
+    workers=settings.image_workers,
+    max_pending=settings.image_max_pending,
+)
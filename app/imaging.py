@@ -0,0 +1,205 @@
+"""
+Pillow encode helpers.
+
+Runs inside worker processes, so it imports nothing else from the app.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+from PIL import Image, ImageOps
+
+FITS = ("contain", "cover")
+# Output format name -> (Pillow format, file extension, media type)
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "avif": ("AVIF", "avif", "image/avif"),
+}
+SOURCE_FORMATS = {"jpg": "jpeg", "jpeg": "jpeg", "png": "png", "webp": "webp", "avif": "avif", "gif": "png"}
+
+
+@dataclass(frozen=True)
+class TransformSpec:
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fit: str = "contain"
+    format: str = "webp"
+    quality: int = 80
+
+    def key(self) -> str:
+        return f"w{self.width or ''}h{self.height or ''}-{self.fit}-q{self.quality}.{self.format}"
+
+
+def _resize(image: Image.Image, spec: TransformSpec) -> Image.Image:
+    if not spec.width and not spec.height:
+        return image
+    # Never upscale: a box larger than the source leaves it at its own size
+    width = min(spec.width or image.width, image.width)
+    height = min(spec.height or image.height, image.height)
+    if spec.fit == "cover" and spec.width and spec.height:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def save_image(image: Image.Image, path: str, format: str, quality: int):
+    """Encode `image` to `path` in one of FORMATS, without any metadata."""
+    pil_format = FORMATS[format][0]
+    if image.mode in ("P", "PA"):
+        image = image.convert("RGBA")
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGB")
+    options = {}
+    if pil_format == "JPEG":
+        options = {"quality": quality, "optimize": True, "progressive": True}
+    elif pil_format == "WEBP":
+        options = {"quality": quality, "method": 4}
+    elif pil_format == "AVIF":
+        options = {"quality": quality}
+    elif pil_format == "PNG":
+        options = {"optimize": True}
+    image.save(path, pil_format, **options)
+
+
+def derivative_path(cache_dir: str, source_path: str, source_stat: os.stat_result, spec: TransformSpec) -> str:
+    """Where the derivative cache keeps `spec` applied to `source_path` (an absolute, resolved path)."""
+    # The source's mtime and size are part of the key, so replacing a source image renders fresh derivatives
+    key = hashlib.sha256(
+        f"{source_path}:{source_stat.st_mtime_ns}:{source_stat.st_size}:{spec.key()}".encode()
+    ).hexdigest()
+    return os.path.join(cache_dir, key[:2], f"{key}.{FORMATS[spec.format][1]}")
+
+
+def render_derivative(source_path: str, dest_path: str, spec: TransformSpec) -> int:
+    """
+    Resize and re-encode `source_path` into `dest_path` and return its size.
+
+    Written to a temporary file first and renamed, so readers never see a
+    partial file.
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = _resize(image, spec)
+        directory = os.path.dirname(dest_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(fd)
+        try:
+            save_image(image, temp_path, spec.format, spec.quality)
+            os.replace(temp_path, dest_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    return os.path.getsize(dest_path)
+
+
+# --- Batch optimisation (see app.optimize_images) ---
+
+# Quality used when a lossy WebP/AVIF has to be re-encoded to drop its metadata
+NEAR_LOSSLESS_QUALITY = 90
+# A re-encode is kept only if it is at least this much smaller than the original
+MIN_SAVING_RATIO = 0.02
+EXIF_ORIENTATION = 0x0112
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _recompress(path: str) -> bool:
+    """
+    Re-encode `path` in place without metadata if that makes it meaningfully smaller.
+
+    JPEGs keep their quantisation tables (quality="keep") and PNGs are
+    lossless, so only WebP/AVIF go through a lossy re-encode. The colour
+    profile and EXIF orientation are kept; everything else (camera data,
+    GPS, thumbnails) is dropped. The original is only replaced if it is
+    unchanged on disk since it was read, so a file being swapped or
+    collected at the same time is left alone.
+    """
+    before = os.stat(path)
+    with Image.open(path) as image:
+        if getattr(image, "n_frames", 1) > 1 or image.format not in ("JPEG", "PNG", "WEBP", "AVIF"):
+            return False
+        options = {}
+        if image.info.get("icc_profile"):
+            options["icc_profile"] = image.info["icc_profile"]
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        if orientation != 1:
+            exif = Image.Exif()
+            exif[EXIF_ORIENTATION] = orientation
+            options["exif"] = exif.tobytes()
+        if image.format == "JPEG":
+            options.update(quality="keep", optimize=True, progressive=True)
+        elif image.format == "PNG":
+            options.update(optimize=True)
+        else:
+            options.update(quality=NEAR_LOSSLESS_QUALITY)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            image.save(temp_path, image.format, **options)
+            after = os.stat(temp_path).st_size
+            current = os.stat(path)
+            if after > before.st_size * (1 - MIN_SAVING_RATIO) or (current.st_size, current.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+                os.remove(temp_path)
+                return False
+            os.chmod(temp_path, before.st_mode & 0o777)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return True
+
+
+def optimize_image(path: str, known_sha256: str, widths, cache_dir: str, quality: int, recompress: bool = True) -> dict:
+    """
+    Recompress one library image and pre-render its responsive WebP widths
+    into the derivative cache, under the same keys GET /images uses. With
+    `recompress` off the file itself is left as it is.
+
+    Returns the file's new size, mtime and hash for the manifest.
+    `skipped` is set, and no re-encode attempted, when its hash still
+    matches `known_sha256`; its widths are still checked, because they are
+    keyed by mtime and the file may only have been touched.
+    """
+    before = os.stat(path).st_size
+    sha256 = file_sha256(path)
+    skipped = sha256 == known_sha256
+    optimized = False if skipped or not recompress else _recompress(path)
+    if optimized:
+        sha256 = file_sha256(path)
+    stat = os.stat(path)
+    source = os.path.realpath(path)
+    derivatives = 0
+    with Image.open(path) as image:
+        source_width = image.width
+    for width in widths:
+        if width >= source_width:
+            continue
+        spec = TransformSpec(width=width, format="webp", quality=quality)
+        dest = derivative_path(cache_dir, source, stat, spec)
+        if not os.path.exists(dest):
+            render_derivative(source, dest, spec)
+            derivatives += 1
+    return {
+        "skipped": skipped,
+        "optimized": optimized,
+        "before": before,
+        "after": stat.st_size,
+        "sha256": sha256,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "derivatives": derivatives,
+    }
@@ -1,19 +1,24 @@
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles 
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine
-from . import models
-from .models import Base
-from .routers import auth, users, blogs, roles, categories, tags, upload, dashboard, projects
+from .database import engine, async_engine, replica_engines
+from .routers import auth, users, blogs, roles, categories, tags, upload, dashboard, projects, images
+from .static_files import CachedStaticFiles
 from .core import settings
+from .startup import lifespan
+from . import sql_tracing
+from . import metrics
+from . import profiling
 
-models.Base.metadata.create_all(bind=engine)
+# Schema, pool and serializer warm-up run in the lifespan (startup.py), not at import
+app = FastAPI(title="DreamCraft Engineering Backend", lifespan=lifespan)
 
-app = FastAPI(title="DreamCraft Engineering Backend")
 
-
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
+app.mount("/uploads", CachedStaticFiles(directory="uploads"), name="uploads")
 
 # CORS middleware
 app.add_middleware(
@@ -24,6 +29,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.metrics_enabled:
+    metrics.configure(settings.metrics_dir, settings.metrics_flush_seconds)
+    app.add_middleware(metrics.MetricsMiddleware)
+
+if settings.profiling_sample_rate > 0 or settings.profiling_slow_ms > 0:
+    app.add_middleware(
+        profiling.ProfilingMiddleware,
+        sampler=profiling.sampler,
+        store=profiling.profile_store,
+        sample_rate=settings.profiling_sample_rate,
+        slow_ms=settings.profiling_slow_ms,
+    )
+
+if settings.sql_tracing_sample_rate > 0:
+    sql_tracing.instrument([engine, *replica_engines] + ([async_engine.sync_engine] if async_engine is not None else []))
+    # Added last so it is outermost and times the whole request
+    app.add_middleware(
+        sql_tracing.SQLTracingMiddleware,
+        sample_rate=settings.sql_tracing_sample_rate,
+        slow_ms=settings.sql_tracing_slow_ms,
+        repeat_threshold=settings.sql_tracing_repeat_threshold,
+    )
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -33,4 +61,7 @@ app.include_router(categories.router)
 app.include_router(tags.router)
 app.include_router(upload.router)
 app.include_router(dashboard.router)
-app.include_router(projects.router)
\ No newline at end of file
+app.include_router(projects.router)
+app.include_router(images.router)
+
+app.state.import_seconds = time.perf_counter() - _import_started
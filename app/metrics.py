@@ -0,0 +1,390 @@
+"""
+Runtime metrics in the Prometheus text format, without a client library.
+
+The registry holds counters, gauges and fixed-bucket histograms.
+MetricsMiddleware feeds it per route (request count by status, latency
+histogram, requests in flight); the DB pools and the in-process caches
+are read when the metrics are collected. GET /dashboard/metrics (admin)
+serves the result.
+
+Each worker process has its own registry. With METRICS_DIR set, every
+worker writes a snapshot of it to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_SECONDS, and a scrape (answered by whichever worker gets
+it, after writing its own snapshot) merges all of them: counters and
+histograms are summed, including those of workers that have exited;
+gauges are summed over live workers only. The directory must be local to
+the host and emptied before the server starts, as prometheus_client's
+multiprocess mode requires.
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cache import response_cache
+from .database import engine, async_engine, replica_engines
+from .images import image_transformer
+from .pool import pool_status
+from .principals import principal_cache
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; covers cached reads (~1 ms) up to bcrypt logins and image encodes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 collect: Optional[Callable[[], Dict[Labels, float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Called at collection time instead of being updated in place (pool and cache statistics)
+        self.collect = collect
+        self._values: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        if self.collect is not None:
+            values = list(self.collect().items())
+        else:
+            with self._lock:
+                values = [(labels, self._copy(value)) for labels, value in self._values.items()]
+        return {"kind": self.kind, "help": self.documentation, "labelnames": list(self.labelnames),
+                "values": [[list(labels), value] for labels, value in values]}
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: Labels = ()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Per label set: observation counts per bucket (not cumulative, the last one is +Inf) and their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def snapshot(self) -> dict:
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = (), collect=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+def merge(snapshots: Iterable[Tuple[Dict[str, dict], bool]]) -> Dict[str, dict]:
+    """Combine (snapshot, worker_alive) pairs from several workers into one snapshot."""
+    merged: Dict[str, dict] = {}
+    totals: Dict[str, Dict[tuple, object]] = {}
+    for snapshot, alive in snapshots:
+        for name, family in snapshot.items():
+            if family["kind"] == "gauge" and not alive:
+                continue
+            if name not in merged:
+                merged[name] = dict(family, values=[])
+                totals[name] = {}
+            values = totals[name]
+            for labels, value in family["values"]:
+                key = tuple(labels)
+                current = values.get(key)
+                if family["kind"] == "histogram":
+                    if current is None:
+                        values[key] = [list(value[0]), value[1]]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                else:
+                    values[key] = (current or 0.0) + value
+    for name, family in merged.items():
+        family["values"] = [[list(labels), value] for labels, value in totals[name].items()]
+    return merged
+
+
+def _escape(value: str, quotes: bool = True) -> str:
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def exposition(snapshot: Dict[str, dict]) -> str:
+    """Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for name, family in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {_escape(family['help'], quotes=False)}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        names = family["labelnames"]
+        for labels, value in sorted(family["values"], key=lambda item: item[0]):
+            if family["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([*family["buckets"], math.inf], counts):
+                cumulative += count
+                bucket = _labels(names, labels, f'le="{_number(bound)}"')
+                lines.append(f"{name}_bucket{bucket} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class FileStore:
+    """One JSON snapshot per worker process in a shared directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.pid = os.getpid()
+
+    def write(self, snapshot: Dict[str, dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.pid}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        # Readers only ever see a complete file
+        os.replace(temporary, path)
+
+    def read_all(self) -> List[Tuple[Dict[str, dict], bool]]:
+        snapshots = []
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed or being replaced
+            snapshots.append((snapshot, _alive(int(entry[:-5]))))
+        return snapshots
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Flusher:
+    """Writes this worker's snapshot to the store every `interval` seconds from a daemon thread."""
+
+    def __init__(self, registry: Registry, store: FileStore, interval: float):
+        self.registry = registry
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        # A forked worker inherits the module but not the thread, and has its own pid
+        self.store.pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.store.write(self.registry.snapshot())
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Last counts; this worker's gauges stop counting once its pid is gone
+        self.store.write(self.registry.snapshot())
+
+
+registry = Registry()
+store: Optional[FileStore] = None
+flusher: Optional[Flusher] = None
+
+
+def configure(directory: Optional[str], flush_seconds: float):
+    global store, flusher
+    if directory:
+        store = FileStore(directory)
+        flusher = Flusher(registry, store, flush_seconds)
+
+
+def render_metrics() -> str:
+    """The exposition for a scrape: this worker's registry, or every worker's when a store is configured."""
+    if store is None:
+        return exposition(registry.snapshot())
+    store.write(registry.snapshot())
+    return exposition(merge(store.read_all()))
+
+
+# HTTP
+http_requests = registry.counter(
+    "http_requests_total", "Requests handled, by route template and status code.", ("method", "route", "status"),
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to the end of its response body.", ("method", "route"),
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "Requests being handled right now.")
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:
+        return scope.get("root_path") or "/"  # a Mount, e.g. /static
+    # Not the raw path: scanners hitting random URLs would create unbounded label sets
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI, so streaming responses are timed to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            method, route = scope["method"], _route_label(scope)
+            http_requests.inc((method, route, str(status_code)))
+            http_request_duration.observe(time.perf_counter() - started, (method, route))
+
+
+# Database pools, read when collected
+def _engines():
+    engines = [("primary", engine)]
+    if async_engine is not None:
+        engines.append(("async", async_engine.sync_engine))
+    engines.extend((f"replica-{index}", replica) for index, replica in enumerate(replica_engines))
+    return engines
+
+
+def _pool_values(key: str) -> Callable[[], Dict[Labels, float]]:
+    def collect():
+        values = {}
+        for name, pool_engine in _engines():
+            status = pool_status(pool_engine)
+            if key in status:
+                values[(name,)] = status[key]
+        return values
+    return collect
+
+
+registry.gauge("db_pool_size", "Connections the pool keeps open.", ("pool",), _pool_values("size"))
+registry.gauge("db_pool_checked_out", "Connections currently checked out.", ("pool",), _pool_values("checked_out"))
+registry.gauge("db_pool_overflow", "Connections open beyond the pool size (negative: not yet opened).", ("pool",), _pool_values("overflow"))
+registry.counter("db_pool_checkouts_total", "Connection checkouts.", ("pool",), _pool_values("checkouts"))
+registry.counter("db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection.", ("pool",), _pool_values("checkout_timeouts"))
+registry.counter("db_pool_connects_total", "New DBAPI connections opened.", ("pool",), _pool_values("connects"))
+registry.counter("db_pool_invalidations_total", "Connections invalidated after an error.", ("pool",), _pool_values("invalidations"))
+
+
+# Caches, read when collected
+def _cache_stats():
+    return {"response": response_cache.stats(), "images": image_transformer.cache.stats(), "principals": principal_cache.stats()}
+
+
+def _cache_values(key: str) -> Callable[[], Dict[Labels, float]]:
+    def collect():
+        return {(name,): stats[key] for name, stats in _cache_stats().items() if key in stats}
+    return collect
+
+
+registry.counter("cache_hits_total", "Cache lookups answered from the cache.", ("cache",), _cache_values("hits"))
+registry.counter("cache_misses_total", "Cache lookups that had to load.", ("cache",), _cache_values("misses"))
+registry.counter("cache_evictions_total", "Entries evicted to stay under the size limit.", ("cache",), _cache_values("evictions"))
+registry.gauge("cache_entries", "Entries currently cached.", ("cache",), _cache_values("entries"))
+registry.gauge("cache_bytes", "Bytes currently cached.", ("cache",), _cache_values("bytes"))
+registry.counter("image_encodes_total", "Image derivatives rendered.", collect=lambda: {(): image_transformer.encodes})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, Table, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Text, ForeignKey, Table, Enum, JSON
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -38,6 +38,8 @@ class User(Base):
     phone_number = Column(String(20), nullable=True)
     hashed_password = Column(String(128), nullable=False)
     is_active = Column(Boolean, default=True)
+    # Embedded in access tokens; bumping it invalidates every token issued before
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     role_id = Column(Integer, ForeignKey("roles.id"))
     role = relationship("Role", back_populates="users")
@@ -50,7 +52,19 @@ class Blog(Base):
     title = Column(String(191), nullable=False)
     slug = Column(String(191), unique=True, index=True, nullable=False)
     content = Column(Text, nullable=False)
-    image_url = Column(String(191)) 
+    # Indexed, like Project.image_url and ProjectImage.url, for the upload reference lookups in upload_gc
+    image_url = Column(String(191), index=True)
+
+    # Derived from content at write time so list pages never need to load it.
+    # Rows that predate these columns have excerpt NULL until `python -m app.rendering` fills them in.
+    excerpt = Column(String(300), nullable=True)
+    word_count = Column(Integer, default=0, server_default="0", nullable=False)
+    reading_time_minutes = Column(Integer, default=1, server_default="1", nullable=False)
+
+    # Rendered once from content (see rendering.py); content_hash says which content and renderer version
+    content_html = Column(Text, nullable=True)
+    toc = Column(JSON, nullable=True)
+    content_hash = Column(String(64), nullable=True)
     
     status = Column(Enum('draft', 'published', name='blogstatusenum'), default='draft', nullable=False)
 
@@ -69,7 +83,7 @@ class Project(Base):
     title = Column(String(191), nullable=False)
     category = Column(String(100), nullable=False) 
     location = Column(String(191), nullable=False)
-    image_url = Column(String(191)) 
+    image_url = Column(String(191), index=True)
     
     client = Column(String(191))
     completion_date = Column(String(100)) 
@@ -77,13 +91,24 @@ class Project(Base):
     description = Column(Text, nullable=True)
 
 
-    images = relationship("ProjectImage", back_populates="project", cascade="all, delete-orphan")
+    images = relationship(
+        "ProjectImage", back_populates="project", cascade="all, delete-orphan",
+        order_by="(ProjectImage.position, ProjectImage.id)",
+    )
 
 class ProjectImage(Base):
     __tablename__ = "project_images"
     id = Column(Integer, primary_key=True, index=True)
-    url = Column(String(191), nullable=False)
+    url = Column(String(191), nullable=False, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
+    # Gallery order; rows are kept across updates, so the id no longer reflects it
+    position = Column(Integer, nullable=False, default=0, server_default="0")
     
     project = relationship("Project", back_populates="images")
-    
\ No newline at end of file
+
+
+class Counter(Base):
+    """Named counts for the dashboard, maintained by crud (see counters.py)."""
+    __tablename__ = "counters"
+    name = Column(String(191), primary_key=True)
+    value = Column(BigInteger, default=0, nullable=False)
@@ -0,0 +1,132 @@
+"""
+Recompress the image library in place and pre-render responsive widths.
+
+    python -m app.optimize_images
+    python -m app.optimize_images --workers 4 --widths 480 960
+
+Walks static/images and uploads/images, strips metadata and recompresses
+every image that gets meaningfully smaller, and renders WebP copies at
+each width into the derivative cache that GET /images serves from.
+Uploads named by the sha256 of their bytes (uploads.content_relpath)
+only get the WebP copies: upload dedup relies on the name matching the
+content, so their bytes must never change under the same name. It is
+safe against the live directories: originals are swapped atomically and
+only if untouched since they were read, and a file is never made larger.
+
+A manifest of each file's hash makes reruns cheap: files whose size and
+mtime are unchanged are not opened, and files whose hash is unchanged are
+not re-encoded. The manifest is saved as results come in, so an
+interrupted run resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+from .core import settings
+from .imaging import SOURCE_FORMATS, optimize_image
+from .uploads import is_content_addressed
+
+DEFAULT_DIRECTORIES = ("static/images", "uploads/images")
+DEFAULT_WIDTHS = (320, 640, 1024, 1600)
+DEFAULT_MANIFEST = "cache/image-optimizer.json"
+SAVE_EVERY = 25
+
+
+def load_manifest(path: str) -> Dict[str, dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(path: str, manifest: Dict[str, dict]):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    with os.fdopen(fd, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def find_images(directories) -> List[str]:
+    paths = []
+    for directory in directories:
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if os.path.splitext(name)[1].lstrip(".").lower() in SOURCE_FORMATS:
+                    paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def run(directories, widths, manifest_path: str, workers=None, quality: int = 80) -> dict:
+    manifest = load_manifest(manifest_path)
+    widths = sorted(widths)
+    report = {"files": 0, "unchanged": 0, "optimized": 0, "failed": 0, "derivatives": 0, "bytes_before": 0, "bytes_after": 0}
+    pending = []
+    for path in find_images(directories):
+        report["files"] += 1
+        entry = manifest.get(path)
+        stat = os.stat(path)
+        if entry and entry.get("widths") == widths and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            report["unchanged"] += 1
+            continue
+        # Same bytes as last run but e.g. touched by an upload dedup: the worker only hashes it
+        known = entry["sha256"] if entry and entry.get("widths") == widths else None
+        pending.append((path, known))
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {
+            executor.submit(optimize_image, path, known, widths, settings.image_cache_dir, quality, not is_content_addressed(path)): path
+            for path, known in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                report["failed"] += 1
+                print(f"failed: {path}: {error}", file=sys.stderr)
+                continue
+            report["derivatives"] += result["derivatives"]
+            if result["skipped"]:
+                report["unchanged"] += 1
+            else:
+                report["optimized"] += result["optimized"]
+                report["bytes_before"] += result["before"]
+                report["bytes_after"] += result["after"]
+            manifest[path] = {"sha256": result["sha256"], "size": result["size"], "mtime_ns": result["mtime_ns"], "widths": widths}
+            if done % SAVE_EVERY == 0:
+                save_manifest(manifest_path, manifest)
+
+    # Drop entries for files that no longer exist (e.g. reclaimed by upload_gc)
+    for path in [path for path in manifest if not os.path.exists(path)]:
+        del manifest[path]
+    save_manifest(manifest_path, manifest)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directories", nargs="*", default=list(DEFAULT_DIRECTORIES))
+    parser.add_argument("--widths", type=int, nargs="+", default=list(DEFAULT_WIDTHS))
+    parser.add_argument("--quality", type=int, default=80, help="WebP quality of the responsive widths (GET /images default is 80)")
+    parser.add_argument("--workers", type=int, default=None, help="encoder processes; defaults to one per core")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    report = run(args.directories, args.widths, args.manifest, args.workers, args.quality)
+    saved = report["bytes_before"] - report["bytes_after"]
+    percent = 100 * saved / report["bytes_before"] if report["bytes_before"] else 0.0
+    print(
+        f"{report['files']} images: {report['optimized']} recompressed, {report['unchanged']} unchanged since last run, "
+        f"{report['failed']} failed; {report['derivatives']} responsive copies rendered"
+    )
+    print(f"processed {report['bytes_before']} bytes -> {report['bytes_after']} bytes, saved {saved} bytes ({percent:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import base64
+import json
+from typing import Optional
+from fastapi import HTTPException, status
+
+# Largest `limit` the paginated list endpoints accept
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Turn the id of the last row on a page into an opaque cursor string.
+    """
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    """
+    Return the row id stored in a cursor. An empty cursor means "first page".
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """
+    Rows are fetched with limit + 1 so we know whether another page exists.
+    Trims the extra row in place and returns the cursor for the next page.
+    """
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    return encode_cursor(rows[-1].id)
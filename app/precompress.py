@@ -0,0 +1,95 @@
+"""
+Write .br and .gz siblings for compressible static assets.
+
+    python -m app.precompress
+    python -m app.precompress static other/dir
+
+CachedStaticFiles serves these instead of the original when the client
+accepts the encoding, so nothing is compressed per request. Siblings are
+only kept when they save at least 5%, are rewritten when older than their
+source, and are written atomically so a running server never sends a
+partial file. Brotli output needs the `brotli` package; without it only
+gzip siblings are written.
+"""
+import argparse
+import gzip
+import os
+import tempfile
+from .static_files import COMPRESSIBLE_EXTENSIONS
+
+try:
+    import brotli
+except ImportError:  # optional: gzip siblings are still written
+    brotli = None
+
+DEFAULT_DIRECTORIES = ("static",)
+MIN_SAVING_RATIO = 0.05
+
+
+def _compressors():
+    # gzip mtime=0 keeps the output (and so its ETag) stable across runs
+    compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append((".br", lambda data: brotli.compress(data, quality=11)))
+    return compressors
+
+
+def _write_atomic(path: str, data: bytes):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+
+def precompress_file(path: str, compressors) -> dict:
+    report = {"written": 0, "removed": 0, "bytes_in": 0, "bytes_out": 0}
+    source_mtime = os.stat(path).st_mtime_ns
+    data = None
+    for suffix, compress in compressors:
+        target = path + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime_ns >= source_mtime:
+            continue
+        if data is None:
+            with open(path, "rb") as file:
+                data = file.read()
+        compressed = compress(data)
+        if len(compressed) > len(data) * (1 - MIN_SAVING_RATIO):
+            if os.path.exists(target):
+                os.remove(target)
+                report["removed"] += 1
+            continue
+        _write_atomic(target, compressed)
+        report["written"] += 1
+        report["bytes_in"] += len(data)
+        report["bytes_out"] += len(compressed)
+    return report
+
+
+def run(directories) -> dict:
+    compressors = _compressors()
+    totals = {"files": 0, "written": 0, "removed": 0, "bytes_in": 0, "bytes_out": 0}
+    for directory in directories:
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                    continue
+                totals["files"] += 1
+                for key, value in precompress_file(os.path.join(root, name), compressors).items():
+                    totals[key] += value
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directories", nargs="*", default=list(DEFAULT_DIRECTORIES))
+    args = parser.parse_args()
+    totals = run(args.directories)
+    encodings = "br and gzip" if brotli is not None else "gzip only (install brotli for .br)"
+    print(
+        f"{totals['files']} compressible files, {encodings}: wrote {totals['written']} siblings "
+        f"({totals['bytes_in']} -> {totals['bytes_out']} bytes), removed {totals['removed']} that no longer pay off"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from .core import settings
+
+
+@dataclass(frozen=True)
+class PrincipalRole:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Read-only snapshot of an authenticated user and their role.
+
+    Exposes the same attributes handlers read from models.User (and that
+    schemas.User serializes), but is not bound to any session, so it can be
+    shared between requests without lazy loads or expired attributes.
+    """
+    id: int
+    email: str
+    name: str
+    phone_number: Optional[str]
+    is_active: bool
+    role_id: Optional[int]
+    role: Optional[PrincipalRole]
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        role = PrincipalRole(id=user.role.id, name=user.role.name) if user.role else None
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            phone_number=user.phone_number,
+            is_active=user.is_active,
+            role_id=user.role_id,
+            role=role,
+            token_version=user.token_version or 0,
+        )
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of principals by user id with a TTL.
+
+    crud drops entries when a user or role changes; the TTL bounds how long
+    another worker process can keep serving a stale entry. Callers read
+    `generation` before loading a user and pass it to put, so a load that
+    raced with an invalidation is not stored.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, like ResponseCache._generation
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_puts = 0
+
+    @property
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, principal: Principal, generation: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self.stale_puts += 1
+                return
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def invalidate_role(self, role_id: int):
+        with self._lock:
+            self._generation += 1
+            for user_id in [uid for uid, (p, _) in self._entries.items() if p.role_id == role_id]:
+                del self._entries[user_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "stale_puts": self.stale_puts}
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.principal_cache_max_entries,
+    ttl=settings.principal_cache_ttl_seconds,
+    enabled=settings.principal_cache_enabled,
+)
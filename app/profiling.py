@@ -0,0 +1,221 @@
+"""
+Stack-sampled profiles of individual requests, kept in an on-disk ring.
+
+With PROFILING_SAMPLE_RATE and/or PROFILING_SLOW_MS set, ProfilingMiddleware
+watches that share of requests (or, with a latency threshold, every
+request). While any watched request is in flight a daemon thread reads
+every thread's Python stack each PROFILING_INTERVAL_MS and adds it to each
+watched request. A request that was sampled, or that ended up slower than
+PROFILING_SLOW_MS, is written to PROFILING_DIR as
+
+    <id>.folded   collapsed stacks ("thread;outer;...;inner count"), the input
+                  of flamegraph.pl, inferno and speedscope
+    <id>.json     method, path, status, duration and sample count
+
+keeping the newest PROFILING_MAX_PROFILES. The admin routes
+/dashboard/profiles list and download them.
+
+Samples are process wide: threads serving other requests at the same time
+show up too (each stack is rooted at its thread's name, and idle threads are
+left out). With both settings at 0 the middleware is not installed at all.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from .core import settings
+
+PROFILE_ID_RE = re.compile(r"^[0-9]+-[0-9]+-[0-9]+$")
+
+# Innermost frames of a thread that is waiting for work rather than doing any
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+STDLIB_DIR = os.path.dirname(os.__file__) + os.sep
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        filename = filename[marker + len("site-packages") + 1:]
+    elif filename.startswith(STDLIB_DIR):
+        filename = filename[len(STDLIB_DIR):]
+    elif filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    # ";" separates frames in the folded format
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _folded_stack(frame, thread_name: str) -> Optional[str]:
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """Samples every thread's stack while at least one request is watched."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._watched: Set[int] = set()
+        self._samples: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._next_token = 0
+
+    def watch(self) -> int:
+        with self._lock:
+            self._next_token += 1
+            token = self._next_token
+            self._watched.add(token)
+            self._samples[token] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+            return token
+
+    def unwatch(self, token: int) -> Counter:
+        with self._lock:
+            self._watched.discard(token)
+            return self._samples.pop(token, Counter())
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._watched:
+                    self._wake.wait()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                stack for ident, frame in sys._current_frames().items() if ident != own
+                for stack in [_folded_stack(frame, names.get(ident, str(ident)))] if stack is not None
+            ]
+            with self._lock:
+                for token in self._watched:
+                    self._samples[token].update(stacks)
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Bounded ring of profiles in a directory shared by the workers."""
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._sequence = 0
+
+    def save(self, samples: Counter, meta: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        # Milliseconds first so names sort oldest to newest; pid and sequence keep workers apart
+        profile_id = f"{int(meta['started_at'] * 1000)}-{os.getpid()}-{self._sequence}"
+        path = os.path.join(self.directory, profile_id)
+        with open(f"{path}.folded", "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        # Metadata last: list() only shows profiles whose stacks are complete
+        with open(f"{path}.json", "w") as f:
+            json.dump(dict(meta, id=profile_id), f)
+        self._trim()
+        return profile_id
+
+    def _ids(self) -> List[str]:
+        try:
+            entries = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((entry[:-5] for entry in entries if entry.endswith(".json")), key=lambda i: tuple(map(int, i.split("-"))))
+
+    def _trim(self):
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass  # another worker trimmed it first
+
+    def list(self) -> List[dict]:
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI, so a streamed response is profiled until its last byte."""
+
+    def __init__(self, app, sampler: Sampler, store: ProfileStore, sample_rate: float = 0.0, slow_ms: float = 0.0):
+        self.app = app
+        self.sampler = sampler
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_ms:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = self.sampler.watch()
+        started_at, started = time.time(), time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            samples = self.sampler.unwatch(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            slow = bool(self.slow_ms) and duration_ms >= self.slow_ms
+            if sampled or slow:
+                meta = {
+                    "method": scope["method"], "path": scope["path"], "status": status_code,
+                    "duration_ms": round(duration_ms, 1), "samples": sum(samples.values()),
+                    "trigger": "slow" if slow else "sampled", "started_at": started_at,
+                }
+                await run_in_threadpool(self.store.save, samples, meta)
+
+
+sampler = Sampler(settings.profiling_interval_ms / 1000)
+profile_store = ProfileStore(settings.profiling_dir, settings.profiling_max_profiles)
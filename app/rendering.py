@@ -0,0 +1,156 @@
+"""
+Blog content rendered to safe HTML once, at write time.
+
+Content is Markdown (raw HTML inside it is allowed and sanitized), so
+clients get `content_html` and `toc` instead of parsing `content` on every
+view. Each rendering is stored with a hash of the source and the renderer
+version; content whose hash matches is never rendered again. Posts
+written before this existed, or after RENDERER_VERSION changes, are
+rendered by the backfill, which also fills in the excerpt and reading
+time of posts that predate those columns (see content.backfill):
+
+    python -m app.rendering
+    python -m app.rendering --workers 4 --batch-size 500
+"""
+import argparse
+import hashlib
+import html
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import markdown
+import nh3
+
+# Bump when the rendered output changes so the backfill re-renders every post
+RENDERER_VERSION = 1
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "code", "dd", "del", "div", "dl", "dt", "em", "figcaption", "figure",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "ins", "kbd", "li", "mark", "ol", "p", "pre", "s",
+    "small", "span", "strong", "sub", "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "abbr": {"title"},
+    "code": {"class"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"align", "colspan", "rowspan"},
+    "th": {"align", "colspan", "rowspan"},
+}
+
+_HEADING_RE = re.compile(r"<h([1-6])>(.*?)</h\1>", re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SLUG_RE = re.compile(r"[^\w]+")
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(f"{RENDERER_VERSION}\0{content or ''}".encode()).hexdigest()
+
+
+def _slugify(text: str) -> str:
+    return _SLUG_RE.sub("-", text.lower()).strip("-_") or "section"
+
+
+def _anchor_headings(body: str) -> Tuple[str, List[dict]]:
+    toc, used = [], {}
+
+    def anchor(match):
+        level, inner = match.group(1), match.group(2)
+        text = html.unescape(_TAG_RE.sub("", inner)).strip()
+        slug = _slugify(text)
+        used[slug] = used.get(slug, 0) + 1
+        if used[slug] > 1:
+            slug = f"{slug}-{used[slug]}"
+        toc.append({"level": int(level), "id": slug, "text": text})
+        return f'<h{level} id="{slug}">{inner} <a class="heading-anchor" href="#{slug}" aria-hidden="true">#</a></h{level}>'
+
+    return _HEADING_RE.sub(anchor, body), toc
+
+
+def render_html(content: str) -> Tuple[str, List[dict]]:
+    """Markdown -> sanitized HTML with heading ids/anchors and lazy images, plus its table of contents."""
+    body = markdown.markdown(content or "", extensions=MARKDOWN_EXTENSIONS)
+    # Sanitizing drops any id the source set itself, so the heading ids below are the only ones
+    body = nh3.clean(body, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+    body, toc = _anchor_headings(body)
+    body = body.replace("<img ", '<img loading="lazy" decoding="async" ')
+    return body, toc
+
+
+def render_content(content: str) -> dict:
+    """The stored rendering of a blog body: column values for Blog."""
+    body, toc = render_html(content)
+    return {"content_html": body, "toc": toc, "content_hash": content_hash(content)}
+
+
+def backfill(db, workers=None, batch_size: int = 500) -> dict:
+    """
+    Render every blog whose stored hash is missing or stale, in parallel.
+
+    Pages through blogs by id; each page's stale posts are spread over the
+    worker processes and written back with one executemany UPDATE. A post
+    edited meanwhile is left alone: the UPDATE only matches the hash read.
+    """
+    from sqlalchemy import bindparam, func, select, update
+    from . import models
+
+    blogs = models.Blog.__table__
+    statement = (
+        update(blogs)
+        .where(blogs.c.id == bindparam("blog_id"), func.coalesce(blogs.c.content_hash, "") == bindparam("old_hash"))
+        .values(content_html=bindparam("html"), toc=bindparam("contents"), content_hash=bindparam("new_hash"))
+    )
+    report = {"checked": 0, "rendered": 0, "skipped": 0}
+    last_id = 0
+    # A few tasks per process per page: enough to balance, few enough to keep pickling cheap
+    chunksize = max(1, batch_size // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(workers) as executor:
+        while True:
+            page = db.execute(
+                select(blogs.c.id, blogs.c.content, blogs.c.content_hash)
+                .where(blogs.c.id > last_id).order_by(blogs.c.id).limit(batch_size)
+            ).all()
+            if not page:
+                break
+            last_id = page[-1].id
+            report["checked"] += len(page)
+            stale = [row for row in page if row.content_hash != content_hash(row.content)]
+            if not stale:
+                continue
+            rendered = executor.map(render_content, [row.content for row in stale], chunksize=chunksize)
+            result = db.execute(statement, [
+                {"blog_id": row.id, "old_hash": row.content_hash or "", "html": r["content_html"],
+                 "contents": r["toc"], "new_hash": r["content_hash"]}
+                for row, r in zip(stale, rendered)
+            ])
+            db.commit()
+            report["rendered"] += result.rowcount if result.rowcount >= 0 else len(stale)
+            print(f"rendered {report['rendered']} of {report['checked']} checked", file=sys.stderr)
+    report["skipped"] = report["checked"] - report["rendered"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None, help="render processes; defaults to one per core")
+    parser.add_argument("--batch-size", type=int, default=500, help="posts read, rendered and written per round")
+    args = parser.parse_args()
+
+    from . import content
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        report = backfill(db, args.workers, args.batch_size)
+        summarized = content.backfill(db, args.batch_size)
+    finally:
+        db.close()
+    print(f"{report['rendered']} rendered, {report['skipped']} already current, {summarized} summaries filled in")
+
+
+if __name__ == "__main__":
+    main()
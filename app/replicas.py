@@ -0,0 +1,121 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from fastapi import Request
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def mark_replica(session, replica: "Replica"):
+    session.info["replica"] = replica.name
+
+
+def is_replica(session) -> bool:
+    """Whether a session (sync or async) reads from a replica, and so may lag behind the primary."""
+    return "replica" in session.info
+
+
+class Replica:
+    def __init__(self, name: str, session_factory, async_session_factory=None):
+        self.name = name
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+
+class ReplicaRouter:
+    """
+    Picks a read replica for safe-method requests.
+
+    Replicas are chosen round-robin or by fewest in-flight sessions. A replica
+    whose session fails with a connection error is ejected for
+    `eject_seconds` and then tried again. A client that has just written
+    (identified by its bearer token) keeps reading from the primary for
+    `sticky_seconds` so it sees its own writes despite replication lag.
+    Stickiness is per worker process. Replica sessions are marked (see
+    is_replica): the search and facet indexes and cached principals are
+    loaded from the primary instead, and the response cache doesn't store
+    replica reads made within `sticky_seconds` of an invalidation.
+
+    To try it locally, copy a SQLite database twice and set
+    DATABASE_REPLICA_URLS='["sqlite:///./r1.db", "sqlite:///./r2.db"]'.
+    """
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        strategy: str = "round_robin",
+        eject_seconds: float = 30.0,
+        sticky_seconds: float = 5.0,
+        max_clients: int = 10000,
+    ):
+        self.replicas = replicas
+        self.strategy = strategy
+        self.eject_seconds = eject_seconds
+        self.sticky_seconds = sticky_seconds
+        self.max_clients = max_clients
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._last_write: "OrderedDict[str, float]" = OrderedDict()
+
+    def route(self, request: Request) -> Optional[Replica]:
+        """Return the replica for this request, or None for the primary."""
+        if not self.replicas:
+            return None
+        # Writers are told apart by their bearer token; anonymous requests never write content
+        key = request.headers.get("authorization")
+        now = time.monotonic()
+        with self._lock:
+            if request.method not in SAFE_METHODS:
+                if key:
+                    self._last_write[key] = now
+                    self._last_write.move_to_end(key)
+                    while len(self._last_write) > self.max_clients:
+                        self._last_write.popitem(last=False)
+                return None
+            last_write = self._last_write.get(key) if key else None
+            if last_write is not None and now - last_write < self.sticky_seconds:
+                return None
+            replica = self._pick()
+            if replica is not None:
+                replica.in_flight += 1
+                replica.served += 1
+            return replica
+
+    def release(self, replica: Replica, failed: bool = False):
+        with self._lock:
+            replica.in_flight -= 1
+            if failed:
+                replica.failures += 1
+                replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def stats(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "in_flight": replica.in_flight,
+                    "served": replica.served,
+                    "failures": replica.failures,
+                }
+                for replica in self.replicas
+            ]
+
+    # Expects self._lock to be held
+    def _pick(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_loaded":
+            return min(healthy, key=lambda replica: replica.in_flight)
+        return healthy[next(self._counter) % len(healthy)]
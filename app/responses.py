@@ -0,0 +1,58 @@
+"""
+Opt-in fast serialization for routes with a response_model.
+
+FastAPI validates what an endpoint returns against its response_model,
+dumps the model to Python objects, runs jsonable_encoder over them and
+finally encodes with the stdlib json module. With FAST_JSON_RESPONSES on,
+routes built with FastJSONRoute skip all of that: the endpoint's result
+goes straight through `cache.render`, a TypeAdapter per response_model
+that validates from attributes and serializes to JSON bytes in
+pydantic-core. The bytes are the same as FastAPI's output
+(benchmarks/json_benchmark.py checks this on every schema).
+
+Endpoints that return a Response themselves are passed through as is.
+"""
+import functools
+import inspect
+from typing import Any, Callable
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from .cache import render
+from .core import settings
+
+
+def _rendering(endpoint: Callable, response_model: Any, status_code: int) -> Callable:
+    def respond(result):
+        if isinstance(result, Response):
+            return result
+        return Response(content=render(response_model, result), status_code=status_code, media_type="application/json")
+
+    # functools.wraps keeps the name, docstring and signature FastAPI reads for injection and OpenAPI
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return respond(await endpoint(*args, **kwargs))
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            # Still in the threadpool, so validation and encoding stay off the event loop
+            return respond(endpoint(*args, **kwargs))
+    return wrapper
+
+
+class FastJSONRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        response_model = kwargs.get("response_model")
+        if (
+            settings.fast_json_responses
+            and response_model is not None
+            and not isinstance(response_model, DefaultPlaceholder)
+            and not kwargs.get("response_model_include")
+            and not kwargs.get("response_model_exclude")
+        ):
+            status_code = kwargs.get("status_code")
+            if isinstance(status_code, DefaultPlaceholder) or status_code is None:
+                status_code = 200
+            endpoint = _rendering(endpoint, response_model, status_code)
+        super().__init__(path, endpoint, **kwargs)
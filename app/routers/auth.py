@@ -1,48 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from .. import crud, schemas
 from ..deps import get_db
-from ..auth import create_access_token
-from passlib.context import CryptContext
+from ..auth import create_access_token, password_hasher
+from ..responses import FastJSONRoute
 
-# -----------------------------
-# Password hashing setup
-# -----------------------------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-MAX_BCRYPT_BYTES = 72  # bcrypt maximum password length
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=FastJSONRoute)
 
-def hash_password(password: str) -> str:
-    """
-    Hash a password safely with bcrypt, truncating to 72 bytes if necessary.
-    """
-    pw_bytes = password.encode("utf-8")[:MAX_BCRYPT_BYTES]
-    return pwd_context.hash(pw_bytes)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Verify a password against a bcrypt hash.
-    """
-    pw_bytes = plain_password.encode("utf-8")[:MAX_BCRYPT_BYTES]
-    return pwd_context.verify(pw_bytes, hashed_password)
-
-router = APIRouter(prefix="/auth", tags=["auth"])
+# These handlers are async so that while bcrypt runs on the hasher's own pool they hold
+# no request thread; the (short) database calls are pushed to the thread pool explicitly.
 
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    hashed_password = await password_hasher.hash_async(user.password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(crud.get_user_by_email, db, email=form_data.username)
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update_async(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": str(user.id)})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    if new_hash:
+        # Stored hash used an old work factor; replace it now that we know the password
+        await run_in_threadpool(crud.update_password_hash, db, user, new_hash)
+    access_token = create_access_token(data={"sub": str(user.id)}, token_version=user.token_version)
+    return {"access_token": access_token, "token_type": "bearer"}
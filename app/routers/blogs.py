@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas, models
-from ..deps import get_db, get_current_user, get_current_admin
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
+from .. import crud, crud_async, schemas, models
+from ..core import settings
+from ..pagination import MAX_PAGE_SIZE, decode_cursor, next_cursor
+from ..cache import response_cache, make_key, render
+from ..replicas import is_replica
+from ..deps import get_db, get_async_db, get_current_user, get_current_admin
+from ..responses import FastJSONRoute
 
-router = APIRouter(prefix="/blogs", tags=["Blogs"])
+router = APIRouter(prefix="/blogs", tags=["Blogs"], route_class=FastJSONRoute)
 
 
 @router.post("/", response_model=schemas.Blog, status_code=201)
@@ -16,9 +22,121 @@ def create_new_blog(
     return crud.create_blog(db=db, blog=blog, author_id=current_user.id)
 
 
-@router.get("/", response_model=List[schemas.Blog])
-def read_published_blogs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_blogs(db, skip=skip, limit=limit)
+def read_published_blogs(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    tag: List[int] = Query([]),
+    category: Optional[int] = None,
+    tag_mode: Literal["all", "any"] = "all",
+    db: Session = Depends(get_db)
+):
+    """
+    Published blogs without their content (see GET /blogs/{slug} for the full
+    post), newest first. Passing `after` (empty for the first page) switches
+    to cursor mode and returns `{"items": [...], "next_cursor": ...}`
+    instead of a plain list.
+
+    `tag` (repeatable) and `category` filter by id; with several tags,
+    `tag_mode=all` requires every tag and `tag_mode=any` at least one.
+    """
+    after_id = decode_cursor(after) if after is not None else None
+    filtered = bool(tag) or category is not None
+    match_all = tag_mode == "all"
+
+    def load():
+        if after is None:
+            if filtered:
+                blogs = crud.get_blogs_filtered(db, tag, category, match_all, skip=skip, limit=limit)
+            else:
+                blogs = crud.get_blogs(db, skip=skip, limit=limit)
+            return render(List[schemas.BlogSummary], blogs)
+        if filtered:
+            blogs = crud.get_blogs_filtered(db, tag, category, match_all, limit=limit + 1, after_id=after_id)
+        else:
+            blogs = crud.get_blogs_after(db, after_id=after_id, limit=limit)
+        return render(schemas.BlogPage, {"items": blogs, "next_cursor": next_cursor(blogs, limit)})
+
+    key = make_key(
+        "blogs:list", skip=skip, limit=limit, after=after,
+        tag=sorted(set(tag)), category=category, tag_mode=tag_mode
+    )
+    body = response_cache.get_or_set(key, load, tags=("blogs", "blogs:list"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+async def read_published_blogs_async(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    tag: List[int] = Query([]),
+    category: Optional[int] = None,
+    tag_mode: Literal["all", "any"] = "all",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Published blogs without their content (see GET /blogs/{slug} for the full
+    post), newest first. Passing `after` (empty for the first page) switches
+    to cursor mode and returns `{"items": [...], "next_cursor": ...}`
+    instead of a plain list.
+
+    `tag` (repeatable) and `category` filter by id; with several tags,
+    `tag_mode=all` requires every tag and `tag_mode=any` at least one.
+    """
+    after_id = decode_cursor(after) if after is not None else None
+    filtered = bool(tag) or category is not None
+    match_all = tag_mode == "all"
+
+    async def load():
+        if after is None:
+            if filtered:
+                blogs = await crud_async.get_blogs_filtered(db, tag, category, match_all, skip=skip, limit=limit)
+            else:
+                blogs = await crud_async.get_blogs(db, skip=skip, limit=limit)
+            return render(List[schemas.BlogSummary], blogs)
+        if filtered:
+            blogs = await crud_async.get_blogs_filtered(db, tag, category, match_all, limit=limit + 1, after_id=after_id)
+        else:
+            blogs = await crud_async.get_blogs_after(db, after_id=after_id, limit=limit)
+        return render(schemas.BlogPage, {"items": blogs, "next_cursor": next_cursor(blogs, limit)})
+
+    key = make_key(
+        "blogs:list", skip=skip, limit=limit, after=after,
+        tag=sorted(set(tag)), category=category, tag_mode=tag_mode
+    )
+    body = await response_cache.aget_or_set(key, load, tags=("blogs", "blogs:list"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+router.get("/", response_model=Union[List[schemas.BlogSummary], schemas.BlogPage])(
+    read_published_blogs_async if settings.db_async else read_published_blogs
+)
+
+
+@router.get("/facets", response_model=schemas.BlogFacets)
+def read_blog_facets(
+    tag: List[int] = Query([]),
+    category: Optional[int] = None,
+    tag_mode: Literal["all", "any"] = "all",
+    db: Session = Depends(get_db)
+):
+    """
+    Published post counts per tag and per category under the given filter
+    (same parameters as GET /blogs/).
+    """
+    return crud.get_blog_facets(db, tag, category, match_all=tag_mode == "all")
+
+
+@router.get("/search", response_model=schemas.BlogSearchResults)
+def search_published_blogs(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Full-text search over published blogs (title, content and tag names),
+    ranked with BM25. Each hit carries a snippet with the matches in <mark>.
+    """
+    return crud.search_blogs(db, q=q, skip=skip, limit=limit)
 
 
 @router.get("/my-blogs", response_model=List[schemas.Blog])
@@ -55,12 +173,29 @@ def read_blog_by_id(
     return db_blog
 
 
-@router.get("/{slug}", response_model=schemas.Blog)
 def read_blog_by_slug(slug: str, db: Session = Depends(get_db)):
-    db_blog = crud.get_blog_by_slug(db, slug=slug)
-    if db_blog is None:
-        raise HTTPException(status_code=404, detail="Blog not found")
-    return db_blog
+    def load():
+        db_blog = crud.get_blog_by_slug(db, slug=slug)
+        if db_blog is None:
+            raise HTTPException(status_code=404, detail="Blog not found")
+        return render(schemas.Blog, db_blog)
+
+    body = response_cache.get_or_set(make_key("blog", slug=slug), load, tags=("blogs", f"blog:{slug}"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+async def read_blog_by_slug_async(slug: str, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        db_blog = await crud_async.get_blog_by_slug(db, slug=slug)
+        if db_blog is None:
+            raise HTTPException(status_code=404, detail="Blog not found")
+        return render(schemas.Blog, db_blog)
+
+    body = await response_cache.aget_or_set(make_key("blog", slug=slug), load, tags=("blogs", f"blog:{slug}"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+router.get("/{slug}", response_model=schemas.Blog)(
+    read_blog_by_slug_async if settings.db_async else read_blog_by_slug
+)
 
 
 @router.put("/{blog_id}", response_model=schemas.Blog)
@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from .. import crud, schemas, models
+from .. import crud, schemas, models, counters
 from ..deps import get_db, get_current_admin
+from ..cache import response_cache
+from ..database import engine, async_engine, replica_engines, replica_router
+from ..pool import pool_status
+from ..images import image_transformer
+from ..transfer import export_ndjson
+from ..responses import FastJSONRoute
+from .. import metrics
+from ..profiling import profile_store
 
-router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"], route_class=FastJSONRoute)
 
 @router.get("/stats", response_model=schemas.DashboardStats)
 def get_stats_for_dashboard(
@@ -14,4 +24,92 @@ def get_stats_for_dashboard(
     Retrieve aggregated statistics for the admin dashboard.
     Requires admin privileges.
     """
-    return crud.get_dashboard_stats(db=db)
\ No newline at end of file
+    return crud.get_dashboard_stats(db=db)
+
+@router.post("/stats/reconcile")
+def reconcile_dashboard_counters(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin)
+):
+    """
+    Recount the dashboard statistics from the tables and correct any drift.
+    Returns the counters that changed as {name: [stored, actual]}.
+    """
+    return counters.reconcile(db)
+
+@router.get("/export")
+def export_content(current_user: models.User = Depends(get_current_admin)):
+    """
+    Stream every category, tag, blog and project as NDJSON, for
+    `python -m app.transfer import` on another environment.
+    """
+    # The generator opens its own connections: a get_db session would already be closed while streaming
+    return StreamingResponse(
+        export_ndjson(engine),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="content.ndjson"'},
+    )
+
+@router.get("/cache")
+def get_cache_stats(current_user: models.User = Depends(get_current_admin)):
+    """
+    Hit, miss and eviction counters for the public response cache.
+    """
+    return response_cache.stats()
+
+@router.get("/images")
+def get_image_stats(current_user: models.User = Depends(get_current_admin)):
+    """
+    Derivative cache size, hits and evictions, and encode counters for the image transform endpoint.
+    """
+    return image_transformer.stats()
+
+@router.get("/metrics")
+def get_metrics(current_user: models.User = Depends(get_current_admin)):
+    """
+    Request, connection pool and cache metrics in the Prometheus text format,
+    merged over every worker when METRICS_DIR is set.
+    """
+    return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+@router.get("/profiles")
+def list_profiles(current_user: models.User = Depends(get_current_admin)):
+    """
+    Request profiles on disk, newest first: method, path, status, duration,
+    sample count and whether the request was sampled or slow.
+    """
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, current_user: models.User = Depends(get_current_admin)):
+    """
+    One profile as collapsed stacks, ready for flamegraph.pl or speedscope.
+    """
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+@router.get("/startup")
+def get_startup_report(request: Request, current_user: models.User = Depends(get_current_admin)):
+    """
+    How long the worker answering took to start, by phase: imports, schema
+    check or create_all, pool and serializer warm-up.
+    """
+    return getattr(request.app.state, "startup", None)
+
+@router.get("/pool")
+def get_pool_stats(current_user: models.User = Depends(get_current_admin)):
+    """
+    Live connection pool statistics: checked-out and overflow connections,
+    checkout wait times and timeouts.
+    """
+    stats = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        stats["async"] = pool_status(async_engine.sync_engine)
+    if replica_engines:
+        stats["replicas"] = [
+            dict(routing, pool=pool_status(replica_engine))
+            for routing, replica_engine in zip(replica_router.stats(), replica_engines)
+        ]
+    return stats
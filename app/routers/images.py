@@ -0,0 +1,66 @@
+import os
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from ..core import settings
+from ..images import image_transformer
+from ..imaging import FORMATS, SOURCE_FORMATS, TransformSpec
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+# URL prefix -> directory it is served from in main.py
+SOURCE_ROOTS = {"static": "static", "uploads": "uploads"}
+
+def _source_path(path: str) -> str:
+    root, _, rest = path.partition("/")
+    if root not in SOURCE_ROOTS or not rest:
+        raise HTTPException(status_code=404, detail="Image not found")
+    base = os.path.realpath(SOURCE_ROOTS[root])
+    source = os.path.realpath(os.path.join(base, rest))
+    # realpath resolves ".." and symlinks, so anything outside the mounted directory is refused
+    if not source.startswith(base + os.sep) or not os.path.isfile(source):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return source
+
+def _check_allowed(name: str, value: Optional[int], allowed):
+    if value is not None and value not in allowed:
+        raise HTTPException(
+            status_code=422, detail=f"{name} must be one of {', '.join(map(str, sorted(allowed)))}"
+        )
+
+@router.get("/{path:path}", response_class=FileResponse)
+async def transform_image(
+    path: str,
+    w: Optional[int] = Query(None, ge=1),
+    h: Optional[int] = Query(None, ge=1),
+    fit: Literal["contain", "cover"] = "contain",
+    format: Optional[Literal["webp", "avif", "jpeg", "png"]] = None,
+    q: int = Query(80, ge=1, le=100),
+):
+    """
+    A resized and/or re-encoded copy of an image under /static or /uploads,
+    e.g. /images/static/images/x.jpg?w=480&format=webp.
+
+    `contain` fits inside w x h keeping the aspect ratio, `cover` crops to
+    exactly w x h; images are never upscaled. Without `format` the source
+    format is kept. Each variant is rendered once and then served from the
+    derivative cache. w and h must be one of IMAGE_SIZES and q one of
+    IMAGE_QUALITIES, which bounds how many variants an image can have.
+    """
+    _check_allowed("w", w, settings.image_sizes)
+    _check_allowed("h", h, settings.image_sizes)
+    _check_allowed("q", q, settings.image_qualities)
+    # realpath and isfile hit the filesystem; keep them off the event loop
+    source = await run_in_threadpool(_source_path, path)
+    if format is None:
+        format = SOURCE_FORMATS.get(os.path.splitext(source)[1].lstrip(".").lower())
+        if format is None:
+            raise HTTPException(status_code=415, detail="Unsupported source image type")
+    spec = TransformSpec(width=w, height=h, fit=fit, format=format, quality=q)
+    derivative = await image_transformer.get(source, spec)
+    return FileResponse(
+        derivative,
+        media_type=FORMATS[format][2],
+        headers={"Cache-Control": "public, max-age=86400"},
+    )
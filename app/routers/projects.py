@@ -1,21 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas, models
-from ..deps import get_db, get_current_admin
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from .. import crud, crud_async, schemas, models
+from ..core import settings
+from ..pagination import MAX_PAGE_SIZE, decode_cursor, next_cursor
+from ..cache import response_cache, make_key, render
+from ..replicas import is_replica
+from ..deps import get_db, get_async_db, get_current_admin
+from ..responses import FastJSONRoute
 
-router = APIRouter(prefix="/projects", tags=["Projects"])
+router = APIRouter(prefix="/projects", tags=["Projects"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=List[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_projects(db, skip=skip, limit=limit)
+def read_projects(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Projects, newest first. Passing `after` switches to cursor mode (see GET /blogs/).
+    """
+    after_id = decode_cursor(after) if after is not None else None
+
+    def load():
+        if after is None:
+            return render(List[schemas.Project], crud.get_projects(db, skip=skip, limit=limit))
+        projects = crud.get_projects_after(db, after_id=after_id, limit=limit)
+        return render(schemas.ProjectPage, {"items": projects, "next_cursor": next_cursor(projects, limit)})
+
+    key = make_key("projects:list", skip=skip, limit=limit, after=after)
+    body = response_cache.get_or_set(key, load, tags=("projects", "projects:list"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+async def read_projects_async(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Projects, newest first. Passing `after` switches to cursor mode (see GET /blogs/).
+    """
+    after_id = decode_cursor(after) if after is not None else None
+
+    async def load():
+        if after is None:
+            return render(List[schemas.Project], await crud_async.get_projects(db, skip=skip, limit=limit))
+        projects = await crud_async.get_projects_after(db, after_id=after_id, limit=limit)
+        return render(schemas.ProjectPage, {"items": projects, "next_cursor": next_cursor(projects, limit)})
+
+    key = make_key("projects:list", skip=skip, limit=limit, after=after)
+    body = await response_cache.aget_or_set(key, load, tags=("projects", "projects:list"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+router.get("/", response_model=Union[List[schemas.Project], schemas.ProjectPage])(
+    read_projects_async if settings.db_async else read_projects
+)
 
-@router.get("/{project_id}", response_model=schemas.Project)
 def read_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = crud.get_project(db, project_id=project_id)
-    if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return db_project
+    def load():
+        db_project = crud.get_project(db, project_id=project_id)
+        if db_project is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return render(schemas.Project, db_project)
+
+    key = make_key("project", project_id=project_id)
+    body = response_cache.get_or_set(key, load, tags=("projects", f"project:{project_id}"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+async def read_project_async(project_id: int, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        db_project = await crud_async.get_project(db, project_id=project_id)
+        if db_project is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return render(schemas.Project, db_project)
+
+    key = make_key("project", project_id=project_id)
+    body = await response_cache.aget_or_set(key, load, tags=("projects", f"project:{project_id}"), replica=is_replica(db))
+    return Response(content=body, media_type="application/json")
+
+router.get("/{project_id}", response_model=schemas.Project)(
+    read_project_async if settings.db_async else read_project
+)
 
 @router.post("/", response_model=schemas.Project, status_code=201)
 def create_new_project(
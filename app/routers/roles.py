@@ -3,8 +3,9 @@ from sqlalchemy.orm import Session
 from typing import List
 from .. import crud, schemas, models
 from ..deps import get_db, get_current_user, get_current_admin
+from ..responses import FastJSONRoute
 
-router = APIRouter(prefix="/roles", tags=["roles"])
+router = APIRouter(prefix="/roles", tags=["roles"], route_class=FastJSONRoute)
 
 @router.post("/", response_model=schemas.Role, status_code=201)
 def create_new_role(
@@ -3,8 +3,9 @@ from sqlalchemy.orm import Session
 from typing import List
 from .. import crud, schemas, models
 from ..deps import get_db, get_current_admin
+from ..responses import FastJSONRoute
 
-router = APIRouter(prefix="/tags", tags=["Blog Tags"])
+router = APIRouter(prefix="/tags", tags=["Blog Tags"], route_class=FastJSONRoute)
 
 @router.post("/", response_model=schemas.Tag, status_code=201)
 def create_new_tag(tag: schemas.TagCreate, db: Session = Depends(get_db), admin: models.User = Depends(get_current_admin)):
@@ -1,36 +1,44 @@
-import shutil
-import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, Request, Depends
 from ..deps import get_current_admin 
+from ..uploads import receive_image
+from ..core import settings
 from .. import models
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
-@router.post("/image/")
+# The body is parsed by receive_image, so describe the form for the docs by hand
+UPLOAD_IMAGE_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+@router.post("/image/", openapi_extra=UPLOAD_IMAGE_OPENAPI)
 async def upload_image(
-    file: UploadFile = File(...),
+    request: Request,
     current_user: models.User = Depends(get_current_admin)
 ):
     """
     Uploads an image, saves it, and returns the public URL.
-    """
-    
-    save_path = "uploads/images"
-    
-   
-    unique_id = uuid.uuid4().hex
-    
-    file_extension = file.filename.split('.')[-1]
-    unique_filename = f"{unique_id}.{file_extension}"
-    
-    file_location = f"{save_path}/{unique_filename}"
 
-    try:
-        
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}")
-
-   
-    return {"file_url": f"/uploads/images/{unique_filename}"}
\ No newline at end of file
+    The file is streamed to disk as it arrives; its type comes from its
+    magic bytes, not the client's filename, and identical files are
+    stored once.
+    """
+    stored = await receive_image(request, max_bytes=settings.upload_max_bytes)
+    return {
+        "file_url": stored.url,
+        "size": stored.size,
+        "sha256": stored.sha256,
+        "content_type": stored.content_type,
+        "deduplicated": stored.deduplicated,
+    }
@@ -1,20 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from .. import crud, schemas, models
-from ..deps import get_db, get_current_user, get_current_admin
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Union
+from .. import crud, crud_async, schemas, models
+from ..core import settings
+from ..pagination import MAX_PAGE_SIZE, decode_cursor, next_cursor
+from ..deps import get_db, get_async_db, get_current_user, get_current_admin
+from ..responses import FastJSONRoute
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=list[schemas.User])
 def read_users(
-    skip: int = 0, 
-    limit: int = 100, 
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     db: Session = Depends(get_db), 
     current_user: models.User = Depends(get_current_user) 
 ):
-   
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+    """
+    Users ordered by id. Passing `after` switches to cursor mode (see GET /blogs/).
+    """
+    if after is None:
+        return crud.get_users(db, skip=skip, limit=limit)
+    users = crud.get_users_after(db, after_id=decode_cursor(after), limit=limit)
+    return {"items": users, "next_cursor": next_cursor(users, limit)}
+
+async def read_users_async(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: models.User = Depends(get_current_user) 
+):
+    """
+    Users ordered by id. Passing `after` switches to cursor mode (see GET /blogs/).
+    """
+    if after is None:
+        return await crud_async.get_users(db, skip=skip, limit=limit)
+    users = await crud_async.get_users_after(db, after_id=decode_cursor(after), limit=limit)
+    return {"items": users, "next_cursor": next_cursor(users, limit)}
+
+router.get("/", response_model=Union[list[schemas.User], schemas.UserPage])(
+    read_users_async if settings.db_async else read_users
+)
 
 @router.get("/me", response_model=schemas.User)
 def read_users_me(current_user: models.User = Depends(get_current_user)):
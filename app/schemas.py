@@ -1,7 +1,25 @@
 # backend/app/schemas.py
-from pydantic import BaseModel, EmailStr
+import functools
+import pydantic
+from pydantic import BaseModel
+from pydantic.networks import validate_email
 from typing import Optional, List # <--- THIS IS THE FIX
 
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_email(value: str) -> str:
+    return validate_email(value)[1]
+
+class EmailStr(pydantic.EmailStr):
+    """
+    pydantic's EmailStr with the email_validator/IDNA check memoized: every
+    response embedding an author would otherwise re-validate the same few
+    addresses per row. Same normalization, errors and JSON schema.
+    """
+    @classmethod
+    def _validate(cls, input_value: str, /) -> str:
+        return _normalize_email(input_value)
+
 # --- Role Schemas ---
 class RoleBase(BaseModel):
     name: str
@@ -30,6 +48,10 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    items: List[User]
+    next_cursor: Optional[str] = None
+
 class UserCreate(UserBase):
     password: str
     role_id: int
@@ -88,23 +110,88 @@ class BlogUpdate(BaseModel):
     category_id: Optional[int] = None
     tag_ids: Optional[List[int]] = None
 
+class TocEntry(BaseModel):
+    level: int
+    id: str
+    text: str
+
 class Blog(BlogBase):
     id: int
     author_id: int
     author: "UserBase" 
     category: Optional[Category] = None
     tags: List[Tag] = []
+    excerpt: Optional[str] = None
+    word_count: int = 0
+    reading_time_minutes: int = 1
+    content_html: Optional[str] = None
+    toc: Optional[List[TocEntry]] = None
+
+    class Config:
+        from_attributes = True
+
+# List view of a blog: everything except the full content
+class BlogSummary(BaseModel):
+    id: int
+    title: str
+    slug: str
+    image_url: Optional[str] = None
+    status: str
+    author_id: int
+    author: "UserBase"
+    category: Optional[Category] = None
+    tags: List[Tag] = []
+    excerpt: Optional[str] = None
+    word_count: int = 0
+    reading_time_minutes: int = 1
 
     class Config:
         from_attributes = True
         
+class BlogPage(BaseModel):
+    items: List[BlogSummary]
+    next_cursor: Optional[str] = None
+
+class FacetCount(BaseModel):
+    id: int
+    name: str
+    count: int
+
+class BlogFacets(BaseModel):
+    total: int
+    tags: List[FacetCount]
+    categories: List[FacetCount]
+
+class BlogSearchHit(BaseModel):
+    blog: BlogSummary
+    score: float
+    snippet: str
+
+class BlogSearchResults(BaseModel):
+    total: int
+    items: List[BlogSearchHit]
+
 # --- Dashboard Schema ---
+class CategoryPostCount(BaseModel):
+    category_id: int
+    name: Optional[str] = None
+    published: int = 0
+    draft: int = 0
+
+class AuthorPostCount(BaseModel):
+    author_id: int
+    name: Optional[str] = None
+    published: int = 0
+    draft: int = 0
+
 class DashboardStats(BaseModel):
     total_users: int
     published_blogs: int
     draft_blogs: int
     total_categories: int
     total_tags: int
+    posts_by_category: List[CategoryPostCount] = []
+    posts_by_author: List[AuthorPostCount] = []
 
 # --- Token Schema ---
 class Token(BaseModel):
@@ -113,6 +200,9 @@ class Token(BaseModel):
 
 # Forward reference resolution
 Blog.model_rebuild()
+BlogSummary.model_rebuild()
+BlogPage.model_rebuild()
+BlogSearchResults.model_rebuild()
 
 class ProjectImageBase(BaseModel):
     url: str
@@ -154,4 +244,8 @@ class Project(ProjectBase):
     images: List[ProjectImage] = [] 
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ProjectPage(BaseModel):
+    items: List[Project]
+    next_cursor: Optional[str] = None
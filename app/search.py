@@ -0,0 +1,229 @@
+import heapq
+import html
+import math
+import re
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from . import models
+from .content import plain_text
+from .core import settings
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has he in is it its of on or that the to was were will with"
+    " this these those you your we our i not but if then so than".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over published blogs with BM25 ranking.
+
+    Postings are stored per term as two parallel arrays (internal doc number,
+    weighted term frequency) which keeps 100k posts in tens of MB rather than
+    a dict per posting. Documents are never edited in place: an update
+    tombstones the old doc number and appends a new one, and the postings are
+    compacted once tombstones pass a fraction of the index.
+
+    The index is built from the database on first use and afterwards kept
+    current by the blog write paths in crud. Because every worker holds its
+    own copy, it is rebuilt once it is older than
+    `settings.search_index_max_age_seconds` to pick up writes made elsewhere.
+    """
+
+    def __init__(self, max_age: float = 0, compact_ratio: float = 0.2):
+        self.max_age = max_age
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.loaded_at: Optional[float] = None
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_len = array("I")
+        self._doc_blog: List[int] = []
+        self._blog_doc: Dict[int, int] = {}
+        self._deleted = set()
+        self._total_len = 0
+
+    @property
+    def loaded(self) -> bool:
+        if self.loaded_at is None:
+            return False
+        return not self.max_age or time.monotonic() - self.loaded_at < self.max_age
+
+    def __len__(self):
+        return len(self._blog_doc)
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def ensure_loaded(self, db: Session, batch_size: int = 1000):
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            self._reset()
+            tag_names: Dict[int, List[str]] = {}
+            tag_rows = db.query(models.blog_tag_association.c.blog_id, models.BlogTag.name).join(
+                models.BlogTag, models.BlogTag.id == models.blog_tag_association.c.tag_id
+            )
+            for blog_id, name in tag_rows.yield_per(batch_size):
+                tag_names.setdefault(blog_id, []).append(name)
+            rows = db.query(models.Blog.id, models.Blog.title, models.Blog.content).filter(
+                models.Blog.status == 'published'
+            )
+            for blog_id, title, content in rows.yield_per(batch_size):
+                self._add(blog_id, title, content, tag_names.get(blog_id, ()))
+            self.loaded_at = time.monotonic()
+
+    # --- incremental maintenance, called from crud ---
+    def index_blog(self, blog: models.Blog):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._delete(blog.id)
+            if blog.status == 'published':
+                self._add(blog.id, blog.title, blog.content, [tag.name for tag in blog.tags])
+            self._maybe_compact()
+
+    def remove_blog(self, blog_id: int):
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._delete(blog_id)
+            self._maybe_compact()
+
+    def add_document(self, blog_id: int, title: str, content: str, tags: Iterable[str] = ()):
+        """Index a document directly without a database, e.g. for benchmarks."""
+        with self._lock:
+            self._delete(blog_id)
+            self._add(blog_id, title, content, tags)
+            if self.loaded_at is None:
+                self.loaded_at = time.monotonic()
+
+    def search(self, query: str, skip: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[int, float]]]:
+        """
+        Rank published blogs for `query`. Returns the total number of matches
+        and the requested page as (blog_id, score) pairs, best first.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return 0, []
+        with self._lock:
+            live = len(self._blog_doc)
+            if not live:
+                return 0, []
+            avg_len = self._total_len / live
+            deleted = self._deleted
+            doc_len = self._doc_len
+            scores: Dict[int, float] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs, freqs = posting
+                df = len(docs)
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                norm = K1 * (1 - B)
+                scale = K1 * B / avg_len
+                for doc, tf in zip(docs, freqs):
+                    if doc in deleted:
+                        continue
+                    score = idf * tf * (K1 + 1) / (tf + norm + scale * doc_len[doc])
+                    scores[doc] = scores.get(doc, 0.0) + score
+            top = heapq.nlargest(skip + limit, scores.items(), key=lambda item: item[1])[skip:]
+            return len(scores), [(self._doc_blog[doc], score) for doc, score in top]
+
+    # The helpers below expect self._lock to be held
+    def _add(self, blog_id: int, title: str, content: str, tags: Iterable[str]):
+        freqs: Dict[str, int] = {}
+        for token in tokenize(title):
+            freqs[token] = freqs.get(token, 0) + TITLE_WEIGHT
+        for tag in tags:
+            for token in tokenize(tag):
+                freqs[token] = freqs.get(token, 0) + TAG_WEIGHT
+        for token in tokenize(plain_text(content)):
+            freqs[token] = freqs.get(token, 0) + 1
+
+        doc = len(self._doc_blog)
+        self._doc_blog.append(blog_id)
+        self._blog_doc[blog_id] = doc
+        length = sum(freqs.values())
+        self._doc_len.append(length)
+        self._total_len += length
+        for term, tf in freqs.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = (array("I"), array("H"))
+            posting[0].append(doc)
+            posting[1].append(min(tf, 0xFFFF))
+
+    def _delete(self, blog_id: int):
+        doc = self._blog_doc.pop(blog_id, None)
+        if doc is not None:
+            self._deleted.add(doc)
+            self._total_len -= self._doc_len[doc]
+
+    def _maybe_compact(self):
+        if len(self._deleted) <= self.compact_ratio * max(len(self._doc_blog), 1):
+            return
+        deleted = self._deleted
+        for term in list(self._postings):
+            docs, freqs = self._postings[term]
+            kept = [(d, f) for d, f in zip(docs, freqs) if d not in deleted]
+            if kept:
+                self._postings[term] = (array("I", (d for d, _ in kept)), array("H", (f for _, f in kept)))
+            else:
+                del self._postings[term]
+        self._deleted = set()
+
+
+def make_snippet(content: str, query: str, width: int = 160) -> str:
+    """
+    Pick the window of the post with the most query terms and wrap the
+    matches in <mark>. The rest of the text is HTML-escaped.
+    """
+    text = plain_text(content)
+    terms = set(tokenize(query))
+    matches = [m for m in _TOKEN_RE.finditer(text) if m.group().lower() in terms]
+    if not matches:
+        return html.escape(text[:width])
+
+    best_start, best_count, j = matches[0].start(), 0, 0
+    for i, match in enumerate(matches):
+        while matches[j].start() < match.end() - width:
+            j += 1
+        if i - j + 1 > best_count:
+            best_count, best_start = i - j + 1, matches[j].start()
+    start = max(0, best_start - width // 4)
+    if start:
+        start = text.find(" ", start) + 1 or start
+    end = min(len(text), start + width)
+
+    parts, pos = [], start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(html.escape(text[pos:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        pos = match.end()
+    parts.append(html.escape(text[pos:end]))
+    return ("…" if start else "") + "".join(parts) + ("…" if end < len(text) else "")
+
+
+search_index = SearchIndex(max_age=settings.search_index_max_age_seconds)
@@ -0,0 +1,139 @@
+"""
+Per-request SQL statement counts and database time.
+
+SQLTracingMiddleware marks a sample of requests (SQL_TRACING_SAMPLE_RATE)
+and engine event listeners attribute every statement executed while
+serving one of them to it, including statements run from the threadpool
+or an AsyncSession, since both inherit the request's context. A traced
+response carries
+
+    Server-Timing: db;dur=12.4;desc="7 queries", app;dur=31.0
+
+and two warnings go to the "app.sql" logger: requests slower than
+SQL_TRACING_SLOW_MS with their statement list, and statements run
+SQL_TRACING_REPEAT_THRESHOLD or more times in one request (the same SQL
+with different parameters, usually a lazy load per row: an N+1).
+
+Untraced requests cost one random() call; statements outside a traced
+request cost a context variable lookup.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("app.sql")
+
+# Longest statement text kept in a log line
+STATEMENT_PREVIEW = 300
+
+
+class RequestQueries:
+    """Statements executed while serving one request, keyed by SQL text."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Dict[str, List[float]] = {}  # sql -> [executions, seconds]
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            totals = self.statements.get(statement)
+            if totals is None:
+                self.statements[statement] = [1, duration]
+            else:
+                totals[0] += 1
+                totals[1] += duration
+
+    def repeated(self, threshold: int):
+        return [(sql, int(n), seconds) for sql, (n, seconds) in self.statements.items() if n >= threshold]
+
+    def describe(self) -> str:
+        lines = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return "\n".join(
+            f"  {int(n)}x {seconds * 1000:.1f} ms  {' '.join(sql.split())[:STATEMENT_PREVIEW]}" for sql, (n, seconds) in lines
+        )
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("sql_tracing_current", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_tracing_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is None:
+        return
+    started = conn.info.get("sql_tracing_started")
+    if started:
+        queries.record(statement, time.perf_counter() - started.pop())
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    started = exception_context.connection.info.get("sql_tracing_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument(engines: Iterable[Engine]):
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+
+
+class SQLTracingMiddleware:
+    """Pure ASGI middleware, so streaming responses and the request's context are left alone."""
+
+    def __init__(self, app, sample_rate: float = 1.0, slow_ms: float = 500.0, repeat_threshold: int = 5):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _current.set(queries)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - started) * 1000
+                timing = f'db;dur={queries.duration * 1000:.1f};desc="{queries.count} queries", app;dur={elapsed:.1f}'
+                message = dict(message, headers=[*message.get("headers", []), (b"server-timing", timing.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, queries, (time.perf_counter() - started) * 1000)
+
+    def _report(self, scope, queries: RequestQueries, elapsed_ms: float):
+        request = f"{scope['method']} {scope['path']}"
+        for sql, count, seconds in queries.repeated(self.repeat_threshold):
+            logger.warning(
+                "possible N+1 in %s: %d executions, %.1f ms of: %s",
+                request, count, seconds * 1000, " ".join(sql.split())[:STATEMENT_PREVIEW],
+            )
+        if elapsed_ms >= self.slow_ms:
+            logger.warning(
+                "slow request %s: %.1f ms, %d queries, %.1f ms in the database\n%s",
+                request, elapsed_ms, queries.count, queries.duration * 1000, queries.describe(),
+            )
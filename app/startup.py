@@ -0,0 +1,152 @@
+"""
+Worker startup and shutdown, run from the FastAPI lifespan rather than at import.
+
+On startup, in order:
+
+    schema        create_all, unless the database is already at the Alembic
+                  head (or DB_CREATE_ALL is off)
+    pool          open the connection pool's connections
+    serializers   configure the ORM mappers and build the fast-path TypeAdapters,
+                  which the first requests would otherwise pay for
+
+Each phase is timed, together with the time it took to import app.main, and
+the breakdown is logged to "app.startup" and served at GET /dashboard/startup.
+
+The Alembic check reads the alembic_version table and the revision ids in
+alembic/versions without importing alembic, whose runtime imports every SQL
+dialect and would cost more than the create_all it saves.
+"""
+import ast
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import exc, text
+from sqlalchemy.orm import configure_mappers
+
+from . import cache, metrics
+from .core import settings
+from .database import POOLED, async_engine, engine
+from .images import image_transformer
+from .models import Base
+from .pool import warm_up, warm_up_async
+
+logger = logging.getLogger("app.startup")
+
+ALEMBIC_VERSIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic", "versions")
+
+
+def migration_heads(directory: str = ALEMBIC_VERSIONS_DIR) -> Set[str]:
+    """Revisions in the migration scripts that no other revision revises."""
+    revisions, revised = set(), set()
+    try:
+        filenames = [name for name in os.listdir(directory) if name.endswith(".py")]
+    except FileNotFoundError:
+        return set()
+    for filename in filenames:
+        with open(os.path.join(directory, filename)) as f:
+            module = ast.parse(f.read(), filename)
+        for node in module.body:
+            if isinstance(node, ast.Assign):
+                target = node.targets[0]
+            elif isinstance(node, ast.AnnAssign) and node.value is not None:
+                target = node.target
+            else:
+                continue
+            if not isinstance(target, ast.Name):
+                continue
+            if target.id == "revision":
+                revisions.add(ast.literal_eval(node.value))
+            elif target.id == "down_revision":
+                down = ast.literal_eval(node.value)
+                revised.update([down] if isinstance(down, str) else down or ())
+    return revisions - revised
+
+
+def database_revisions(connection) -> Set[str]:
+    try:
+        return {row[0] for row in connection.execute(text("SELECT version_num FROM alembic_version"))}
+    except exc.DBAPIError:
+        return set()  # never migrated
+
+
+def ensure_schema() -> str:
+    """Create missing tables unless migrations already manage the schema; returns what was done."""
+    if not settings.db_create_all:
+        return "skipped (DB_CREATE_ALL off)"
+    heads = migration_heads()
+    if heads:
+        with engine.connect() as connection:
+            current = database_revisions(connection)
+        if current == heads:
+            return f"skipped, at alembic head {','.join(sorted(heads))}"
+        logger.warning(
+            "database is at alembic revision %s, the scripts' head is %s: run `alembic upgrade head`",
+            ",".join(sorted(current)) or "(none)", ",".join(sorted(heads)),
+        )
+    Base.metadata.create_all(bind=engine)
+    return "create_all"
+
+
+def warm_serializers(app) -> int:
+    """Configure mappers and build the TypeAdapters FastJSONRoute uses; returns how many were built."""
+    configure_mappers()
+    if not settings.fast_json_responses:
+        return 0
+    schemas = {route.response_model for route in app.routes if isinstance(route, APIRoute) and route.response_model is not None}
+    for schema in schemas:
+        cache.adapter(schema)
+    return len(schemas)
+
+
+class StartupReport:
+    def __init__(self, import_seconds: Optional[float] = None):
+        self.phases: List[dict] = []
+        if import_seconds is not None:
+            self.phases.append({"phase": "imports", "ms": round(import_seconds * 1000, 1)})
+
+    async def run(self, name: str, function, *args):
+        started = time.perf_counter()
+        result = await function(*args)
+        self.phases.append({"phase": name, "ms": round((time.perf_counter() - started) * 1000, 1), "result": result})
+        return result
+
+    def as_dict(self) -> dict:
+        return {"total_ms": round(sum(phase["ms"] for phase in self.phases), 1), "phases": self.phases}
+
+    def summary(self) -> str:
+        parts = [f"{p['phase']} {p['ms']:.0f} ms" + (f" ({p['result']})" if p.get("result") not in (None, "") else "") for p in self.phases]
+        return f"worker {os.getpid()} started in {self.as_dict()['total_ms']:.0f} ms: " + ", ".join(parts)
+
+
+async def _warm_pool():
+    # Open the pool's connections now rather than on the first requests after boot
+    if not POOLED:
+        return "not pooled"
+    connections = settings.db_pool_warmup if settings.db_pool_warmup is not None else settings.db_pool_size
+    opened = await run_in_threadpool(warm_up, engine, connections)
+    if async_engine is not None:
+        await warm_up_async(async_engine, connections)
+    return f"{opened} connections"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    report = StartupReport(getattr(app.state, "import_seconds", None))
+    await report.run("schema", run_in_threadpool, ensure_schema)
+    await report.run("pool", _warm_pool)
+    await report.run("serializers", run_in_threadpool, warm_serializers, app)
+    if metrics.flusher is not None:
+        metrics.flusher.start()
+    app.state.startup = report.as_dict()
+    logger.info(report.summary())
+    try:
+        yield
+    finally:
+        image_transformer.shutdown()
+        if metrics.flusher is not None:
+            metrics.flusher.stop()
@@ -0,0 +1,208 @@
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate
+from mimetypes import guess_type
+from typing import Optional, Tuple
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Upload names are a uuid4 hex or a sha256 (see uploads.py), and static/images uses the same uuid naming
+IMMUTABLE_NAME = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{64})$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Extensions worth serving precompressed; app.precompress writes the .br/.gz siblings
+COMPRESSIBLE_EXTENSIONS = frozenset({
+    ".css", ".js", ".mjs", ".json", ".map", ".svg", ".html", ".txt", ".xml", ".ico", ".webmanifest",
+})
+# Preferred first
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CHUNK_SIZE = 256 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_immutable(path: str) -> bool:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return bool(IMMUTABLE_NAME.match(stem))
+
+
+def make_etag(stat_result: os.stat_result, encoding: Optional[str] = None) -> str:
+    # mtime (ns) and size change whenever a file is replaced, even one whose name is a content hash,
+    # so an If-Range resume can never splice different bytes onto a partial download
+    tag = f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def accepted_encodings(header: str) -> set:
+    """Content codings from an Accept-Encoding header, minus any refused with q=0."""
+    accepted = set()
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        refused = False
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    refused = float(value) == 0
+                except ValueError:
+                    refused = True
+        if coding and not refused:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    The inclusive (start, end) of a single-range `Range` header.
+
+    Returns None when the header should be ignored (malformed, or several
+    ranges, which are answered with the whole file) and raises a 416 when
+    the range lies outside the file.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+class FileSliceResponse(Response):
+    """Sends a file, or one byte range of it, in chunks read off the event loop."""
+
+    def __init__(self, path: str, headers: dict, status_code: int = 200, start: int = 0, length: int = 0, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.length = length
+        self.send_body = send_body
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.length
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                else:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": False})
+                    return
+        # Empty file, or it shrank underneath us; close the body rather than leave the client waiting
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with caching headers suited to this app's file naming.
+
+    - Files named by a uuid or content hash never change, so they get a
+      one-year `immutable` Cache-Control and browsers stop revalidating
+      them. Everything else is `no-cache` and revalidates cheaply.
+    - Strong ETags from mtime and size, answered with 304 on
+      If-None-Match/If-Modified-Since.
+    - Single byte-range requests (206/416, honouring If-Range).
+    - For compressible types, a `.br`/`.gz` sibling written by
+      app.precompress is sent when the client accepts that encoding.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+        # One thread hop for the lookup, the sibling stat and building the headers
+        return await anyio.to_thread.run_sync(self._respond, path, scope)
+
+    def _respond(self, path: str, scope: Scope) -> Response:
+        try:
+            full_path, stat_result = self.lookup_path(path)
+        except PermissionError:
+            raise HTTPException(status_code=401)
+        except OSError:
+            raise HTTPException(status_code=404)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+        return self.cached_file_response(full_path, stat_result, scope)
+
+    def _precompressed(self, full_path: str, stat_result: os.stat_result, request_headers: Headers):
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding in accepted:
+                try:
+                    encoded_stat = os.stat(full_path + suffix)
+                except FileNotFoundError:
+                    continue
+                # A sibling older than its source is stale until app.precompress runs again
+                if encoded_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                    return encoding, full_path + suffix, encoded_stat
+        return None, full_path, None
+
+    # Runs in the thread pool (see get_response)
+    def cached_file_response(self, full_path: str, stat_result: os.stat_result, scope: Scope) -> Response:
+        request_headers = Headers(scope=scope)
+        media_type = self._media_type(full_path)
+        headers = {
+            "content-type": media_type,
+            "accept-ranges": "bytes",
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": IMMUTABLE_CACHE_CONTROL if is_immutable(full_path) else REVALIDATE_CACHE_CONTROL,
+        }
+        encoding, send_path = None, full_path
+        if os.path.splitext(full_path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            headers["vary"] = "Accept-Encoding"
+            encoding, send_path, encoded_stat = self._precompressed(full_path, stat_result, request_headers)
+            if encoding:
+                headers["content-encoding"] = encoding
+                stat_result = encoded_stat
+        etag = make_etag(stat_result, encoding)
+        headers["etag"] = etag
+
+        if self._not_modified(etag, headers["last-modified"], request_headers):
+            return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "content-type"})
+
+        send_body = scope["method"] != "HEAD"
+        size = stat_result.st_size
+        byte_range = None
+        if "range" in request_headers and request_headers.get("if-range", etag) == etag:
+            byte_range = parse_range(request_headers["range"], size)
+        if byte_range is None:
+            return FileSliceResponse(send_path, headers, length=size, send_body=send_body)
+        start, end = byte_range
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+        return FileSliceResponse(send_path, headers, status_code=206, start=start, length=end - start + 1, send_body=send_body)
+
+    @staticmethod
+    def _media_type(path: str) -> str:
+        media_type = guess_type(path)[0] or "application/octet-stream"
+        return f"{media_type}; charset=utf-8" if media_type.startswith("text/") else media_type
+
+    @staticmethod
+    def _not_modified(etag: str, last_modified: str, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match uses weak comparison, and takes precedence over If-Modified-Since
+            return if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            since, modified = parsedate(if_modified_since), parsedate(last_modified)
+            return since is not None and modified is not None and since >= modified
+        return False
@@ -0,0 +1,290 @@
+"""
+Bulk NDJSON export and import of blogs, projects and their taxonomy.
+
+    python -m app.transfer export -o content.ndjson
+    python -m app.transfer import content.ndjson --chunk-size 2000
+
+One JSON object per line, each with a "type": category and tag rows
+first, then blogs (category and tags by name, author by email), then
+projects (with their gallery URLs). Users and roles are not exported;
+on import, authors are matched by email, and blogs whose author is not a
+user here are skipped (counted in blogs_skipped) since every post needs one.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import select
+from sqlalchemy.engine import Connection, Engine
+from . import models
+from .content import summarize
+from .rendering import render_content
+
+STREAM_BATCH = 1000
+DEFAULT_CHUNK_SIZE = 1000
+
+blogs = models.Blog.__table__
+projects = models.Project.__table__
+project_images = models.ProjectImage.__table__
+categories = models.BlogCategory.__table__
+tags = models.BlogTag.__table__
+users = models.User.__table__
+blog_tags = models.blog_tag_association
+
+BLOG_FIELDS = ("title", "slug", "content", "image_url", "status")
+PROJECT_FIELDS = ("title", "category", "location", "image_url", "client", "completion_date", "value", "description")
+
+
+# --- Export ---
+
+def _stream(connection: Connection, statement):
+    # Server-side cursor (stream_results) so rows arrive in batches instead of all at once
+    result = connection.execution_options(stream_results=True, yield_per=STREAM_BATCH).execute(statement)
+    yield from result.mappings().partitions()
+
+
+def _names_by_owner(connection: Connection, statement, ids: List[int]) -> Dict[int, List[str]]:
+    grouped: Dict[int, List[str]] = {owner_id: [] for owner_id in ids}
+    for owner_id, name in connection.execute(statement):
+        grouped[owner_id].append(name)
+    return grouped
+
+
+def export_records(engine: Engine) -> Iterator[dict]:
+    """
+    Every exported row as a dict, in import order, with constant memory.
+
+    Rows are streamed from one connection; the tags and gallery of each
+    batch are looked up on a second one, since a streaming cursor has to
+    be drained before its connection can run anything else.
+    """
+    with engine.connect() as stream, engine.connect() as lookup:
+        for table, kind in ((categories, "category"), (tags, "tag")):
+            for batch in _stream(stream, select(table.c.name, table.c.description).order_by(table.c.id)):
+                for row in batch:
+                    yield {"type": kind, "name": row["name"], "description": row["description"]}
+
+        statement = (
+            select(blogs.c.id, *(blogs.c[field] for field in BLOG_FIELDS), categories.c.name.label("category"), users.c.email.label("author_email"))
+            .outerjoin(categories, categories.c.id == blogs.c.category_id)
+            .outerjoin(users, users.c.id == blogs.c.author_id)
+            .order_by(blogs.c.id)
+        )
+        for batch in _stream(stream, statement):
+            ids = [row["id"] for row in batch]
+            tag_names = _names_by_owner(
+                lookup,
+                select(blog_tags.c.blog_id, tags.c.name).join(tags, tags.c.id == blog_tags.c.tag_id)
+                .where(blog_tags.c.blog_id.in_(ids)).order_by(blog_tags.c.blog_id, tags.c.name),
+                ids,
+            )
+            for row in batch:
+                record = {"type": "blog", **{field: row[field] for field in BLOG_FIELDS}}
+                record.update(category=row["category"], tags=tag_names[row["id"]], author_email=row["author_email"])
+                yield record
+
+        for batch in _stream(stream, select(projects.c.id, *(projects.c[field] for field in PROJECT_FIELDS)).order_by(projects.c.id)):
+            ids = [row["id"] for row in batch]
+            gallery = _names_by_owner(
+                lookup,
+                select(project_images.c.project_id, project_images.c.url)
+                .where(project_images.c.project_id.in_(ids))
+                .order_by(project_images.c.project_id, project_images.c.position, project_images.c.id),
+                ids,
+            )
+            for row in batch:
+                yield {"type": "project", **{field: row[field] for field in PROJECT_FIELDS}, "gallery": gallery[row["id"]]}
+
+
+def export_ndjson(engine: Engine) -> Iterator[bytes]:
+    for record in export_records(engine):
+        yield json.dumps(record, ensure_ascii=False).encode() + b"\n"
+
+
+# --- Import ---
+
+class Importer:
+    """
+    Loads exported records in chunks: each chunk is a handful of
+    executemany INSERTs and one commit, instead of a commit and refresh
+    per row. Categories and tags are matched by name and created when
+    missing; blogs whose slug already exists are skipped. Projects have
+    no natural key, so importing the same file twice duplicates them.
+    """
+
+    def __init__(self, connection: Connection, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.category_ids = dict(connection.execute(select(categories.c.name, categories.c.id)).all())
+        self.tag_ids = dict(connection.execute(select(tags.c.name, tags.c.id)).all())
+        self.author_ids = dict(connection.execute(select(users.c.email, users.c.id)).all())
+        self.report = {"categories": 0, "tags": 0, "blogs": 0, "blogs_skipped": 0, "projects": 0, "gallery_images": 0}
+        self._pending: Dict[str, List[dict]] = {"category": [], "tag": [], "blog": [], "project": []}
+
+    def add(self, record: dict):
+        kind = record.get("type")
+        if kind not in self._pending:
+            raise ValueError(f"unknown record type: {kind!r}")
+        pending = self._pending[kind]
+        pending.append(record)
+        if len(pending) >= self.chunk_size:
+            self._flush(kind)
+
+    def finish(self) -> dict:
+        for kind in ("category", "tag", "blog", "project"):
+            self._flush(kind)
+        return self.report
+
+    def _flush(self, kind: str):
+        if kind in ("blog", "project"):
+            # Taxonomy first: a blog would otherwise create a pending category or tag by name, without its description
+            self._flush("category")
+            self._flush("tag")
+        records, self._pending[kind] = self._pending[kind], []
+        if not records:
+            return
+        if kind == "category":
+            self._ensure_names(categories, self.category_ids, {r["name"]: r.get("description") for r in records}, "categories")
+        elif kind == "tag":
+            self._ensure_names(tags, self.tag_ids, {r["name"]: r.get("description") for r in records}, "tags")
+        elif kind == "blog":
+            self._insert_blogs(records)
+        else:
+            self._insert_projects(records)
+        self.connection.commit()
+
+    def _ensure_names(self, table, ids: Dict[str, int], wanted: Dict[str, Optional[str]], counter: str):
+        missing = [name for name in wanted if name is not None and name not in ids]
+        if not missing:
+            return
+        self.connection.execute(table.insert(), [{"name": name, "description": wanted[name]} for name in missing])
+        ids.update(self.connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(missing))).all())
+        self.report[counter] += len(missing)
+
+    def _insert_blogs(self, records: List[dict]):
+        # Categories and tags referenced before (or without) their own records
+        self._ensure_names(categories, self.category_ids, {r.get("category"): None for r in records}, "categories")
+        self._ensure_names(tags, self.tag_ids, {name: None for r in records for name in r.get("tags", ())}, "tags")
+
+        slugs = [record["slug"] for record in records]
+        existing = set(self.connection.execute(select(blogs.c.slug).where(blogs.c.slug.in_(slugs))).scalars())
+        rows, seen = [], set()
+        for record in records:
+            author_id = self.author_ids.get(record.get("author_email"))
+            if record["slug"] in existing or record["slug"] in seen or author_id is None:
+                self.report["blogs_skipped"] += 1
+                continue
+            seen.add(record["slug"])
+            row = {field: record.get(field) for field in BLOG_FIELDS}
+            row["status"] = row["status"] or "draft"
+            row.update(summarize(row["content"]))
+            row.update(render_content(row["content"]))
+            row["category_id"] = self.category_ids.get(record.get("category"))
+            row["author_id"] = author_id
+            rows.append(row)
+        if not rows:
+            return
+        self.connection.execute(blogs.insert(), rows)
+        # Portable across MySQL (no multi-row RETURNING): read the new ids back by slug
+        blog_ids = dict(self.connection.execute(select(blogs.c.slug, blogs.c.id).where(blogs.c.slug.in_(list(seen)))).all())
+        links = [
+            {"blog_id": blog_ids[record["slug"]], "tag_id": self.tag_ids[name]}
+            for record in records if record["slug"] in seen
+            for name in dict.fromkeys(record.get("tags", ()))
+        ]
+        if links:
+            self.connection.execute(blog_tags.insert(), links)
+        self.report["blogs"] += len(rows)
+
+    def _insert_projects(self, records: List[dict]):
+        rows = [{field: record.get(field) for field in PROJECT_FIELDS} for record in records]
+        dialect = self.connection.dialect
+        if dialect.insert_executemany_returning_sort_by_parameter_order:
+            project_ids = self.connection.execute(
+                projects.insert().returning(projects.c.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+        else:
+            # Projects have no natural key to read ids back by; insert them singly, galleries still go in bulk
+            project_ids = [self.connection.execute(projects.insert(), row).inserted_primary_key[0] for row in rows]
+        images = [
+            {"project_id": project_id, "url": url, "position": position}
+            for project_id, record in zip(project_ids, records)
+            for position, url in enumerate(record.get("gallery", ()))
+        ]
+        if images:
+            self.connection.execute(project_images.insert(), images)
+        self.report["projects"] += len(rows)
+        self.report["gallery_images"] += len(images)
+
+
+def import_ndjson(engine: Engine, lines: Iterable, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Import NDJSON lines (str or bytes), then reconcile the dashboard
+    counters and drop the caches and in-memory indexes of this process.
+
+    Other processes, such as the running API workers, are not signalled:
+    they serve their cached responses for up to RESPONSE_CACHE_TTL_SECONDS
+    and their search and facet indexes for up to
+    SEARCH_INDEX_MAX_AGE_SECONDS / FACET_INDEX_MAX_AGE_SECONDS after the
+    import. Restart them to see the imported content at once.
+    """
+    from .cache import response_cache
+    from .counters import reconcile
+    from .database import SessionLocal
+    from .facets import facet_index
+    from .search import search_index
+
+    with engine.connect() as connection:
+        importer = Importer(connection, chunk_size)
+        for line in lines:
+            if line.strip():
+                importer.add(json.loads(line))
+        report = importer.finish()
+
+    response_cache.invalidate("blogs", "projects")
+    search_index.reset()
+    facet_index.reset()
+    db = SessionLocal()
+    try:
+        reconcile(db)
+    finally:
+        db.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write NDJSON to a file or stdout")
+    export_parser.add_argument("-o", "--output", default="-")
+    import_parser = commands.add_parser("import", help="read NDJSON from a file or stdin")
+    import_parser.add_argument("input", nargs="?", default="-")
+    import_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per executemany/commit")
+    args = parser.parse_args()
+
+    from .database import engine
+
+    if args.command == "export":
+        output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        with output:
+            for line in export_ndjson(engine):
+                output.write(line)
+        return
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    with source:
+        report = import_ndjson(engine, source, args.chunk_size)
+    print(", ".join(f"{count} {name.replace('_', ' ')}" for name, count in report.items()), file=sys.stderr)
+
+    from .core import settings
+
+    windows = [
+        ("response cache", settings.response_cache_ttl_seconds),
+        ("search index", settings.search_index_max_age_seconds),
+        ("facet index", settings.facet_index_max_age_seconds),
+    ]
+    stale = ", ".join(f"{name} {f'{seconds:g}s' if seconds else 'until restart'}" for name, seconds in windows)
+    print(f"running API workers may serve pre-import data for up to: {stale}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Reclaim upload files that no blog, project or gallery image refers to.
+
+    python -m app.upload_gc --dry-run
+    python -m app.upload_gc --min-age-hours 24
+
+Deleting a blog or editing a project gallery never removes files itself,
+because with content-addressed storage the same file can back several
+rows. This command finds the orphans in bulk instead.
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from . import models
+from .uploads import REUSE_MARKER_DIR, UPLOAD_DIR, UPLOAD_URL_PREFIX, reuse_marker_path
+
+# Candidates are re-checked against the database in batches of this size before deletion
+RECHECK_BATCH = 500
+
+
+def _reference_query(urls: Iterable[str] = None):
+    columns = (models.Blog.image_url, models.Project.image_url, models.ProjectImage.url)
+    if urls is None:
+        selects = [select(column).where(column.like(f"{UPLOAD_URL_PREFIX}/%")) for column in columns]
+    else:
+        urls = list(urls)
+        selects = [select(column).where(column.in_(urls)) for column in columns]
+    return union_all(*selects)
+
+
+def reference_counts(db: Session, urls: Iterable[str] = None) -> Dict[str, int]:
+    """
+    Number of rows pointing at each upload URL, across Blog.image_url,
+    Project.image_url and ProjectImage.url. With `urls`, only those are
+    looked up (through the column indexes); otherwise every upload URL is.
+    """
+    return Counter(db.execute(_reference_query(urls)).scalars())
+
+
+def _walk(directory: str) -> Iterator[os.DirEntry]:
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+            yield entry
+
+
+def _path_to_url(path: str, directory: str) -> str:
+    return f"{UPLOAD_URL_PREFIX}/" + os.path.relpath(path, directory).replace(os.sep, "/")
+
+
+def _reused_since(path: str, directory: str, marker_dir: str, cutoff: float) -> bool:
+    try:
+        return os.stat(reuse_marker_path(os.path.relpath(path, directory), marker_dir)).st_mtime > cutoff
+    except FileNotFoundError:
+        return False
+
+
+def _remove_empty_dirs(directory: str):
+    for root, _, _ in os.walk(directory, topdown=False):
+        if root != directory:
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass  # not empty, or a new upload landed in it
+
+
+def collect_garbage(
+    db: Session, directory: str = UPLOAD_DIR, min_age_seconds: float = 86400, dry_run: bool = False,
+    marker_dir: str = REUSE_MARKER_DIR,
+) -> dict:
+    """
+    Delete files under `directory` that nothing references.
+
+    Files written or reused within `min_age_seconds` are left alone: an
+    upload is written before the blog or project that uses it is saved, and
+    reusing a deduplicated file touches its marker under `marker_dir`.
+    Candidates are re-checked against the database just before deletion,
+    so a row saved while the directory was being scanned still protects its
+    file.
+    """
+    referenced = reference_counts(db)
+    cutoff = time.time() - min_age_seconds
+    report = {"scanned": 0, "referenced": 0, "recent": 0, "deleted": 0, "bytes_freed": 0}
+    candidates: List[os.DirEntry] = []
+    for entry in _walk(directory):
+        report["scanned"] += 1
+        stat = entry.stat(follow_symlinks=False)
+        if referenced.get(_path_to_url(entry.path, directory)):
+            report["referenced"] += 1
+        elif stat.st_mtime > cutoff or _reused_since(entry.path, directory, marker_dir, cutoff):
+            report["recent"] += 1
+        else:
+            candidates.append(entry)
+
+    for start in range(0, len(candidates), RECHECK_BATCH):
+        batch = candidates[start:start + RECHECK_BATCH]
+        # End the previous read transaction so a REPEATABLE READ snapshot doesn't hide new rows
+        db.commit()
+        still_referenced = reference_counts(db, [_path_to_url(entry.path, directory) for entry in batch])
+        for entry in batch:
+            if still_referenced.get(_path_to_url(entry.path, directory)):
+                report["referenced"] += 1
+                continue
+            if _reused_since(entry.path, directory, marker_dir, cutoff):
+                report["recent"] += 1
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                try:
+                    os.remove(reuse_marker_path(os.path.relpath(entry.path, directory), marker_dir))
+                except FileNotFoundError:
+                    pass
+            report["deleted"] += 1
+            report["bytes_freed"] += size
+
+    if not dry_run:
+        _remove_empty_dirs(directory)
+        if os.path.isdir(marker_dir):
+            _remove_empty_dirs(marker_dir)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default=UPLOAD_DIR)
+    parser.add_argument("--min-age-hours", type=float, default=24.0)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted without deleting it")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        report = collect_garbage(db, args.directory, args.min_age_hours * 3600, args.dry_run)
+    finally:
+        db.close()
+    verb = "would free" if args.dry_run else "freed"
+    print(
+        f"scanned {report['scanned']} files: {report['referenced']} referenced, {report['recent']} too recent, "
+        f"{report['deleted']} unreferenced ({verb} {report['bytes_freed']} bytes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
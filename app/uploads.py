@@ -0,0 +1,248 @@
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_DIR = "uploads/images"
+UPLOAD_URL_PREFIX = "/uploads/images"
+# Reusing a deduplicated upload touches a marker here instead of the published file, whose mtime
+# is part of its ETag and Last-Modified; upload_gc treats a recent marker like a recent file
+REUSE_MARKER_DIR = os.path.join("cache", "upload-reuse")
+# Body bytes buffered before each hop to the thread pool for hashing and writing
+WRITE_CHUNK_BYTES = 1024 * 1024
+SNIFF_BYTES = 16
+# Room for the multipart boundary and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+# mkstemp creates files 0600; published uploads get 0644 less the umask so a separate web
+# server can read them. os.umask can only be read by setting it, so do it once at import
+# rather than racing other threads per upload.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+PUBLISHED_MODE = 0o644 & ~_UMASK
+
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """Return (extension, media type) from an image's leading bytes, or None if it isn't a supported image."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg", "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png", "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif", "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "avif", "image/avif"
+    return None
+
+
+@dataclass
+class StoredImage:
+    path: str
+    url: str
+    size: int
+    sha256: str
+    extension: str
+    content_type: str
+    # True when identical bytes were already stored and that file was reused
+    deduplicated: bool = False
+
+
+class _ImageWriter:
+    """Hashes and writes one file part to a temporary file next to its final location."""
+
+    def __init__(self, directory: str):
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.hash.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class _ImagePartReceiver:
+    """
+    python-multipart callbacks for a form with a single file field.
+
+    Callbacks run synchronously inside parser.write(), so they only collect
+    file bytes in `pending`; receive_image() hands them to the thread pool.
+    """
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        self.found = False
+        self.finished = False
+        self._in_file = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("latin-1")
+        # Only the first part with the expected name is kept; anything else in the form is skipped
+        self._in_file = name == self.field_name and b"filename" in options and not self.found
+        self.found = self.found or self._in_file
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.pending.append(data[start:end])
+            self.pending_bytes += end - start
+
+    def on_part_end(self):
+        if self._in_file:
+            self.finished = True
+            self._in_file = False
+
+    def take_pending(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        return data
+
+
+def content_relpath(sha256: str, extension: str) -> str:
+    """Storage path of a file under UPLOAD_DIR, derived from its hash and fanned out over two directory levels."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension}"
+
+
+CONTENT_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+def is_content_addressed(path: str) -> bool:
+    """Whether a file is named by the sha256 of its bytes, as content_relpath names uploads."""
+    return bool(CONTENT_HASH_NAME.match(os.path.splitext(os.path.basename(path))[0]))
+
+
+def reuse_marker_path(relpath: str, marker_dir: str = REUSE_MARKER_DIR) -> str:
+    return os.path.join(marker_dir, relpath)
+
+
+def _mark_reused(relpath: str):
+    marker = reuse_marker_path(relpath)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, "a"):
+        pass
+    os.utime(marker)
+
+
+def _publish(writer: _ImageWriter, directory: str, extension: str):
+    writer.file.close()
+    relpath = content_relpath(writer.hash.hexdigest(), extension)
+    final_path = os.path.join(directory, relpath)
+    if os.path.exists(final_path):
+        # Restart the GC grace period so the copy being reused isn't reclaimed before it's referenced
+        _mark_reused(relpath)
+        # Checked again after marking: if it was collected in the meantime, store this copy instead
+        if os.path.exists(final_path):
+            os.remove(writer.temp_path)
+            return relpath, True
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.chmod(writer.temp_path, PUBLISHED_MODE)
+    os.replace(writer.temp_path, final_path)
+    return relpath, False
+
+
+async def receive_image(request: Request, max_bytes: int, field_name: str = "file", directory: str = UPLOAD_DIR) -> StoredImage:
+    """
+    Stream a multipart image upload straight from the request body to disk.
+
+    The body is parsed as it arrives rather than spooled by the form parser
+    first, so an oversized upload is rejected (413) as soon as it crosses
+    `max_bytes`, and a file whose leading bytes are not a supported image
+    is rejected (415) before the rest of it is read. Hashing and file
+    writes happen in the thread pool, one buffered chunk at a time.
+
+    Files are stored under a path derived from their SHA-256, so uploading
+    the same bytes twice returns the existing file.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a multipart/form-data body")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds {max_bytes} bytes")
+
+    receiver = _ImagePartReceiver(field_name)
+    parser = MultipartParser(boundary, receiver.callbacks())
+    writer = await run_in_threadpool(_ImageWriter, directory)
+    image_type = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if writer.size + receiver.pending_bytes > max_bytes:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds {max_bytes} bytes")
+            if image_type is None and (receiver.pending_bytes >= SNIFF_BYTES or receiver.finished):
+                image_type = sniff_image_type(b"".join(receiver.pending)[:SNIFF_BYTES])
+                if image_type is None:
+                    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Not a supported image type")
+            if receiver.pending_bytes >= WRITE_CHUNK_BYTES or (receiver.finished and receiver.pending):
+                await run_in_threadpool(writer.write, receiver.take_pending())
+        parser.finalize()
+        if not receiver.found:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Missing file field '{field_name}'")
+        if receiver.pending:
+            await run_in_threadpool(writer.write, receiver.take_pending())
+        if image_type is None:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Not a supported image type")
+        relpath, deduplicated = await run_in_threadpool(_publish, writer, directory, image_type[0])
+    except BaseException as error:
+        # Covers rejections, client disconnects and malformed bodies alike; done inline
+        # because awaiting here could itself be cancelled and leak the temp file
+        writer.discard()
+        if isinstance(error, FormParserError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body") from error
+        raise
+
+    return StoredImage(
+        path=os.path.join(directory, relpath),
+        url=f"{UPLOAD_URL_PREFIX}/{relpath}",
+        size=writer.size,
+        sha256=writer.hash.hexdigest(),
+        extension=image_type[0],
+        content_type=image_type[1],
+        deduplicated=deduplicated,
+    )
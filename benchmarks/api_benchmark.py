@@ -0,0 +1,434 @@
+"""
+Throughput, latency and SQL queries per request for every API route, in-process.
+
+    python -m benchmarks.api_benchmark --output bench.json
+    python -m benchmarks.api_benchmark --baseline bench.json --threshold 0.2
+
+Seeds a fresh database (a throwaway SQLite file unless --database-url is
+given; its tables are dropped and recreated) with a synthetic dataset
+built from --seed: users spread over roles, blogs fanned out over
+categories and tags, and projects with galleries. Every route in
+app/routers is then driven through the ASGI app with httpx at the given
+concurrency, with no server or network in between. Read routes go first,
+then writes, then deletes (against rows created for them), so the reads
+see the dataset as seeded. The response cache is off unless
+--response-cache is passed, so reads reach the database.
+
+Each endpoint reports req/s, p50/p95/p99 latency in ms and SQL statements
+per request, from the fastest of --repeat runs. --output writes the results as JSON. With --baseline, the
+run is compared against an earlier JSON file. The exit status is 1 if
+any endpoint is more than --threshold slower (p50, or lower req/s), or
+if it runs more queries per request. A route with no
+scenario here is reported as an error, so new routes get covered.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = [
+    "steel", "concrete", "design", "site", "build", "beam", "load", "survey", "bridge", "tower", "foundation",
+    "crane", "permit", "schedule", "budget", "timber", "glass", "facade", "drainage", "asphalt", "rebar", "formwork",
+]
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    # i -> (url, extra httpx request kwargs)
+    request: Callable[[int], Tuple[str, dict]]
+    expect: Tuple[int, ...] = (200,)
+    total: Optional[int] = None
+    # Rows created before the scenario runs (e.g. ones to delete), passed on as self.rows
+    setup: Optional[Callable[[int], list]] = None
+    rows: list = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def configure(args, workdir: str):
+    """Environment for app.core.Settings; must run before anything under app is imported."""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ["RESPONSE_CACHE_ENABLED"] = "1" if args.response_cache else "0"
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # Uploads and image derivatives go to the scratch directory; static/ is linked in for the mount
+    os.symlink(os.path.join(REPO_ROOT, "static"), os.path.join(workdir, "static"))
+    os.makedirs(os.path.join(workdir, "uploads", "images"))
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+
+def seed(args) -> dict:
+    from sqlalchemy import select
+    from app import auth, models
+    from app.database import Base, engine
+    from app.transfer import import_ndjson
+
+    rng = random.Random(args.seed)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    password_hash = auth.hash_password("bench")
+    role_names = ["admin", "editor", "viewer"] + [f"role-{i}" for i in range(max(0, args.roles - 3))]
+    with engine.begin() as connection:
+        connection.execute(models.Role.__table__.insert(), [{"name": name} for name in role_names])
+        role_ids = dict(connection.execute(select(models.Role.name, models.Role.id)).all())
+        connection.execute(models.User.__table__.insert(), [
+            {"name": f"User {i}", "email": f"user{i}@example.com", "hashed_password": password_hash,
+             "role_id": role_ids["admin"] if i == 0 else role_ids[rng.choice(role_names[1:] or role_names)]}
+            for i in range(args.users)
+        ])
+
+    categories = [f"category-{i}" for i in range(args.categories)]
+    tags = [f"tag-{i}" for i in range(args.tags)]
+
+    def records():
+        for i in range(args.posts):
+            words = rng.choices(WORDS, k=args.words)
+            content = f"## {' '.join(words[:3]).title()}\n\n" + " ".join(words[3:])
+            yield json.dumps({
+                "type": "blog", "title": f"Post {i}", "slug": f"post-{i}", "content": content, "image_url": None,
+                "status": "published" if rng.random() < 0.8 else "draft", "category": rng.choice(categories),
+                "tags": rng.sample(tags, min(args.tags_per_post, len(tags))),
+                "author_email": f"user{rng.randrange(args.users)}@example.com",
+            })
+        for i in range(args.projects):
+            yield json.dumps({
+                "type": "project", "title": f"Project {i}", "category": rng.choice(["Civil", "Residential", "Industrial"]),
+                "location": "Site", "image_url": None, "client": None, "completion_date": None, "value": None,
+                "description": " ".join(rng.choices(WORDS, k=50)),
+                "gallery": [f"/uploads/images/project-{i}-{j}.jpg" for j in range(args.gallery)],
+            })
+
+    import_ndjson(engine, records(), chunk_size=1000)
+    with engine.connect() as connection:
+        blogs = connection.execute(select(models.Blog.id, models.Blog.slug, models.Blog.status)).all()
+        return {
+            "rng": rng,
+            "admin_token": auth.create_access_token({"sub": str(connection.execute(
+                select(models.User.id).where(models.User.email == "user0@example.com")).scalar_one())}),
+            "role_ids": role_ids,
+            "user_ids": connection.execute(select(models.User.id)).scalars().all(),
+            "published": [(blog_id, slug) for blog_id, slug, status in blogs if status == "published"],
+            "blog_ids": [blog_id for blog_id, _, _ in blogs],
+            "category_ids": connection.execute(select(models.BlogCategory.id)).scalars().all(),
+            "tag_ids": connection.execute(select(models.BlogTag.id)).scalars().all(),
+            "project_ids": connection.execute(select(models.Project.id)).scalars().all(),
+        }
+
+
+def insert_rows(table, make_row: Callable[[int], dict], count: int) -> List[int]:
+    """Rows for a delete scenario, inserted directly rather than through the routes being measured."""
+    from app.database import engine
+
+    tag = f"{time.monotonic_ns():x}"
+    with engine.begin() as connection:
+        return [connection.execute(table.insert(), make_row(f"{tag}-{i}")).inserted_primary_key[0] for i in range(count)]
+
+
+def build_scenarios(data: dict, args) -> List[Scenario]:
+    from app import auth, models
+
+    rng = data["rng"]
+    published, tag_ids, category_ids = data["published"], data["tag_ids"], data["category_ids"]
+    image = sorted(name for name in os.listdir("static/images") if name.endswith(".jpg"))[0]
+    with open(os.path.join("static/images", image), "rb") as file:
+        image_bytes = file.read()
+    pick = lambda items, i: items[(i * 7919) % len(items)]
+    few = max(3, args.requests // 20)
+    viewer_role = data["role_ids"]["viewer"]
+
+    def user_row(tag):
+        return {"name": "Disposable", "email": f"disposable-{tag}@example.com",
+                "hashed_password": "x", "role_id": viewer_role}
+
+    return [
+        # --- reads ---
+        Scenario("GET", "/blogs/", lambda i: (f"/blogs/?limit=20&skip={pick(range(0, 200, 20), i)}", {})),
+        Scenario("GET", "/blogs/facets", lambda i: (f"/blogs/facets?tag={pick(tag_ids, i)}&category={pick(category_ids, i)}", {})),
+        Scenario("GET", "/blogs/search", lambda i: (f"/blogs/search?q={pick(WORDS, i)}+{pick(WORDS, i + 1)}", {})),
+        Scenario("GET", "/blogs/my-blogs", lambda i: ("/blogs/my-blogs", {}), total=few),
+        Scenario("GET", "/blogs/by-id/{blog_id}", lambda i: (f"/blogs/by-id/{pick(published, i)[0]}", {})),
+        Scenario("GET", "/blogs/{slug}", lambda i: (f"/blogs/{pick(published, i)[1]}", {})),
+        Scenario("GET", "/projects/", lambda i: ("/projects/?limit=20", {})),
+        Scenario("GET", "/projects/{project_id}", lambda i: (f"/projects/{pick(data['project_ids'], i)}", {})),
+        Scenario("GET", "/users/", lambda i: ("/users/?limit=50", {})),
+        Scenario("GET", "/users/me", lambda i: ("/users/me", {})),
+        Scenario("GET", "/users/{user_id}", lambda i: (f"/users/{pick(data['user_ids'], i)}", {})),
+        Scenario("GET", "/roles/", lambda i: ("/roles/", {})),
+        Scenario("GET", "/categories/", lambda i: ("/categories/", {})),
+        Scenario("GET", "/tags/", lambda i: ("/tags/", {})),
+        Scenario("GET", "/dashboard/stats", lambda i: ("/dashboard/stats", {})),
+        Scenario("GET", "/dashboard/cache", lambda i: ("/dashboard/cache", {})),
+        Scenario("GET", "/dashboard/images", lambda i: ("/dashboard/images", {})),
+        Scenario("GET", "/dashboard/pool", lambda i: ("/dashboard/pool", {})),
+        Scenario("GET", "/dashboard/startup", lambda i: ("/dashboard/startup", {})),
+        Scenario("GET", "/dashboard/metrics", lambda i: ("/dashboard/metrics", {})),
+        Scenario("GET", "/dashboard/profiles", lambda i: ("/dashboard/profiles", {})),
+        # Profiling is off while benchmarking, so this measures the lookup of a missing profile
+        Scenario("GET", "/dashboard/profiles/{profile_id}", lambda i: ("/dashboard/profiles/0-0-0", {}), expect=(404,)),
+        Scenario("GET", "/dashboard/export", lambda i: ("/dashboard/export", {}), total=few),
+        # A handful of widths: the first request per width encodes, the rest are derivative cache hits
+        Scenario("GET", "/images/{path:path}", lambda i: (f"/images/static/images/{image}?w={pick([160, 320, 480, 640], i)}", {})),
+        # --- writes ---
+        Scenario("POST", "/auth/login", lambda i: ("/auth/login", {"data": {"username": "user0@example.com", "password": "bench"}})),
+        Scenario("POST", "/auth/register", lambda i: ("/auth/register", {"json": {
+            "email": f"register-{i}-{rng.random():.8f}@example.com", "name": "New", "password": "bench", "role_id": viewer_role}})),
+        Scenario("POST", "/roles/", lambda i: ("/roles/", {"json": {"name": f"bench-role-{i}-{rng.random():.8f}"}}), expect=(201,)),
+        Scenario("POST", "/categories/", lambda i: ("/categories/", {"json": {"name": f"bench-category-{i}-{rng.random():.8f}"}}), expect=(201,)),
+        Scenario("POST", "/tags/", lambda i: ("/tags/", {"json": {"name": f"bench-tag-{i}-{rng.random():.8f}"}}), expect=(201,)),
+        Scenario("POST", "/blogs/", lambda i: ("/blogs/", {"json": {
+            "title": f"New post {i}", "slug": f"bench-post-{i}-{rng.random():.8f}", "status": "published",
+            "content": "## New\n\n" + " ".join(rng.choices(WORDS, k=args.words)), "category_id": pick(category_ids, i),
+            "tag_ids": rng.sample(tag_ids, min(args.tags_per_post, len(tag_ids)))}}), expect=(201,)),
+        Scenario("POST", "/projects/", lambda i: ("/projects/", {"json": {
+            "title": f"New project {i}", "category": "Civil", "location": "Site",
+            "gallery_urls": [f"/uploads/images/new-{i}-{j}.jpg" for j in range(args.gallery)]}}), expect=(201,)),
+        Scenario("POST", "/upload/image/", lambda i: ("/upload/image/", {"files": {"file": (image, image_bytes, "image/jpeg")}})),
+        Scenario("POST", "/dashboard/stats/reconcile", lambda i: ("/dashboard/stats/reconcile", {}), total=few),
+        Scenario("PUT", "/users/{user_id}", lambda i: (f"/users/{pick(data['user_ids'][1:] or data['user_ids'], i)}", {"json": {"name": f"Renamed {i}"}})),
+        Scenario("PUT", "/roles/{role_id}", lambda i: (f"/roles/{data['role_ids']['editor']}", {"json": {"name": "editor"}})),
+        Scenario("PUT", "/categories/{category_id}", lambda i: (f"/categories/{pick(category_ids, i)}", {"json": {
+            "name": f"renamed-category-{pick(category_ids, i)}", "description": f"Updated {i}"}})),
+        Scenario("PUT", "/tags/{tag_id}", lambda i: (f"/tags/{pick(tag_ids, i)}", {"json": {
+            "name": f"renamed-tag-{pick(tag_ids, i)}", "description": f"Updated {i}"}})),
+        Scenario("PUT", "/blogs/{blog_id}", lambda i: (f"/blogs/{pick(data['blog_ids'], i)}", {"json": {
+            "title": f"Edited {i}", "tag_ids": rng.sample(tag_ids, min(args.tags_per_post, len(tag_ids)))}})),
+        # Once a project has been edited, each further edit swaps just its first image, the common change
+        Scenario("PUT", "/projects/{project_id}", lambda i: (f"/projects/{pick(data['project_ids'], i)}", {"json": {
+            "gallery_urls": [f"/uploads/images/edited-{i}.jpg"] + [f"/uploads/images/gallery-{j}.jpg" for j in range(1, args.gallery)]}})),
+        # --- deletes, each against its own pre-inserted row ---
+        Scenario("DELETE", "/blogs/{blog_id}", lambda i: (None, {}), setup=lambda n: insert_rows(models.Blog.__table__, lambda tag: {
+            "title": "Disposable", "slug": f"disposable-{tag}", "content": "x", "status": "published",
+            "author_id": data["user_ids"][0], "category_id": category_ids[0]}, n)),
+        Scenario("DELETE", "/categories/{category_id}", lambda i: (None, {}),
+                 setup=lambda n: insert_rows(models.BlogCategory.__table__, lambda tag: {"name": f"disposable-{tag}"}, n)),
+        Scenario("DELETE", "/tags/{tag_id}", lambda i: (None, {}),
+                 setup=lambda n: insert_rows(models.BlogTag.__table__, lambda tag: {"name": f"disposable-{tag}"}, n)),
+        Scenario("DELETE", "/roles/{role_id}", lambda i: (None, {}),
+                 setup=lambda n: insert_rows(models.Role.__table__, lambda tag: {"name": f"disposable-{tag}"}, n)),
+        Scenario("DELETE", "/projects/{project_id}", lambda i: (None, {}), setup=lambda n: insert_rows(
+            models.Project.__table__, lambda tag: {"title": f"Disposable {tag}", "category": "Civil", "location": "Site"}, n)),
+        Scenario("DELETE", "/users/{user_id}", lambda i: (None, {}),
+                 setup=lambda n: insert_rows(models.User.__table__, user_row, n)),
+        # Each request signs in as its own disposable user and deletes it
+        Scenario("DELETE", "/users/me", lambda i: ("/users/me", {}),
+                 setup=lambda n: [auth.create_access_token({"sub": str(user_id)})
+                                  for user_id in insert_rows(models.User.__table__, user_row, n)]),
+    ]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *_):
+        self.count += 1
+
+    def attach(self):
+        from sqlalchemy import event
+        from app.database import async_engine, engine, replica_engines
+
+        for target in [engine, *replica_engines] + ([async_engine.sync_engine] if async_engine is not None else []):
+            event.listen(target, "before_cursor_execute", self)
+
+
+async def run_scenario(client, scenario: Scenario, headers: dict, concurrency: int, total: int, queries: QueryCounter) -> dict:
+    latencies, statuses = [], {}
+    queue = iter(range(total))
+
+    def prepare(i):
+        url, kwargs = scenario.request(i)
+        request_headers = headers
+        if scenario.rows:
+            row = scenario.rows[i]
+            if url is None:
+                url = scenario.path.split("{")[0] + str(row)
+            else:
+                request_headers = {"Authorization": f"Bearer {row}"}
+        return url, dict(kwargs, headers=request_headers)
+
+    async def worker():
+        for i in queue:
+            url, kwargs = prepare(i)
+            started = time.perf_counter()
+            response = await client.request(scenario.method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    queries.count = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[max(0, min(len(latencies) - 1, round(len(latencies) * p) - 1))] * 1000
+
+    return {
+        "requests": total,
+        "errors": sum(count for status, count in statuses.items() if status not in scenario.expect),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "queries_per_request": queries.count / total,
+    }
+
+
+async def run(args, scenarios: List[Scenario], token: str) -> Dict[str, dict]:
+    import httpx
+    from app.main import app
+
+    queries = QueryCounter()
+    queries.attach()
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    # A failing endpoint counts as a 500 instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for scenario in scenarios:
+                if args.only and not any(part in scenario.name for part in args.only):
+                    continue
+                total = scenario.total or args.requests
+                rows = scenario.setup(1 + total * args.repeat) if scenario.setup else []
+                # One warm-up request (plans, pools, first-render caches) outside the measurement
+                scenario.rows = rows[:1]
+                await run_scenario(client, scenario, headers, 1, 1, queries)
+                runs = []
+                for attempt in range(args.repeat):
+                    scenario.rows = rows[1 + attempt * total:1 + (attempt + 1) * total]
+                    runs.append(await run_scenario(client, scenario, headers, args.concurrency, total, queries))
+                # Best of the repeats: noise on a shared machine only ever makes a run slower
+                r = results[scenario.name] = max(runs, key=lambda run: run["rps"])
+                print(
+                    f"{scenario.name:<34}{r['rps']:>9.0f}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}"
+                    f"{r['queries_per_request']:>9.1f}{r['errors']:>8}",
+                    flush=True,
+                )
+    return results
+
+
+def uncovered_routes(scenarios: List[Scenario]) -> List[str]:
+    from fastapi.routing import APIRoute
+    from app.main import app
+
+    covered = {scenario.name for scenario in scenarios}
+    return sorted(
+        f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods if f"{method} {route.path}" not in covered
+    )
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        # Timings of failing requests say nothing about the endpoint; those show up as errors instead
+        if before is None or before["errors"] or current["errors"]:
+            continue
+        # p95/p99 of a few hundred requests swing too much between identical runs to gate on
+        if current["p50"] > before["p50"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {before['p50']:.1f} -> {current['p50']:.1f} ms")
+        if current["rps"] < before["rps"] / (1 + threshold):
+            regressions.append(f"{name}: req/s {before['rps']:.0f} -> {current['rps']:.0f}")
+        # Query counts are deterministic for a given dataset, so any increase counts
+        if current["queries_per_request"] > before["queries_per_request"] + 0.05:
+            regressions.append(f"{name}: queries/request {before['queries_per_request']:.1f} -> {current['queries_per_request']:.1f}")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="sync SQLAlchemy URL (tables are recreated); default is a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--roles", type=int, default=3)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=300, help="words per post")
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--tags", type=int, default=40)
+    parser.add_argument("--tags-per-post", type=int, default=4)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--gallery", type=int, default=8, help="images per project")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint (heavy ones run fewer)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1, help="measure each endpoint this many times and keep the fastest run")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="keeps login/register from dominating the run")
+    parser.add_argument("--response-cache", action="store_true", help="leave the public response cache on")
+    parser.add_argument("--only", nargs="*", help="run only endpoints whose name contains one of these")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a regression, e.g. 0.2 = 20%%")
+    args = parser.parse_args()
+
+    # Relative to where we were started; configure() changes into the scratch directory
+    args.output = args.output and os.path.abspath(args.output)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    workdir = tempfile.mkdtemp(prefix="api-benchmark-")
+    configure(args, workdir)
+    started = time.perf_counter()
+    data = seed(args)
+    print(f"seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    scenarios = build_scenarios(data, args)
+    missing = uncovered_routes(scenarios)
+
+    print(f"{'endpoint':<34}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+    results = asyncio.run(run(args, scenarios, data["admin_token"]))
+
+    if args.output:
+        report = {
+            "meta": {
+                "revision": git_revision(), "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(), "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+                "settings": {name: value for name, value in vars(args).items() if name not in ("output", "baseline", "only")},
+            },
+            "endpoints": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+
+    failed = False
+    if missing:
+        print(f"routes without a benchmark scenario: {', '.join(missing)}", file=sys.stderr)
+        failed = True
+    errors = {name: r["statuses"] for name, r in results.items() if r["errors"]}
+    if errors:
+        print(f"unexpected statuses: {errors}", file=sys.stderr)
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["endpoints"], args.threshold)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}", file=sys.stderr)
+    if failed:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
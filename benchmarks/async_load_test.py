@@ -0,0 +1,141 @@
+"""
+Throughput and tail latency of the sync (thread pool) and async (AsyncSession)
+database modes under concurrent requests.
+
+    python -m benchmarks.async_load_test --concurrency 200 --requests 4000
+
+For each mode a uvicorn worker is started with DB_ASYNC=0/1 against the same
+seeded database (a throwaway SQLite file unless --database-url is given) and
+the response cache disabled, so every request reaches the database. Needs the
+async driver for the chosen database (aiosqlite for the default).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def seed(database_url: str, posts: int):
+    os.environ["DATABASE_URL"] = database_url
+    from app import auth, models
+    from app.content import summarize
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    role = models.Role(name="admin")
+    db.add(role)
+    db.flush()
+    user = models.User(name="Bench", email="bench@example.com", hashed_password=auth.hash_password("bench"), role_id=role.id)
+    category = models.BlogCategory(name="General")
+    tags = [models.BlogTag(name=f"tag-{i}") for i in range(20)]
+    db.add_all([user, category, *tags])
+    db.flush()
+    for i in range(posts):
+        content = " ".join(random.choices(["steel", "concrete", "design", "site", "build"], k=300))
+        blog = models.Blog(
+            title=f"Post {i}", slug=f"post-{i}", content=content, status="published",
+            author_id=user.id, category_id=category.id, tags=random.sample(tags, 3), **summarize(content)
+        )
+        db.add(blog)
+    user_id = user.id
+    db.commit()
+    db.close()
+    return auth.create_access_token({"sub": str(user_id)})
+
+
+async def drive(base_url: str, paths, headers, concurrency: int, total: int, method: str = "GET", data=None, expect=(200,)):
+    latencies = []
+    errors = 0
+    queue = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for i in queue:
+            path = paths[i % len(paths)]
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=headers, data=data)
+                ok = response.status_code in expect
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await client.request(method, paths[0], headers=headers, data=data)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="sync SQLAlchemy URL; default is a temporary SQLite file")
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    token = seed(database_url, args.posts)
+    headers = {"Authorization": f"Bearer {token}"}
+    scenarios = {
+        "GET /blogs/{slug}": [f"/blogs/post-{i}" for i in range(args.posts)],
+        "GET /users/me (auth)": ["/users/me"],
+        "GET /blogs/?limit=20": ["/blogs/?limit=20"],
+    }
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for mode in ("0", "1"):
+        env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC=mode, RESPONSE_CACHE_ENABLED="0")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            wait_until_up(base_url)
+            for name, paths in scenarios.items():
+                results[(name, mode)] = asyncio.run(drive(base_url, paths, headers, args.concurrency, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'scenario':<24}{'mode':<7}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name in scenarios:
+        for mode, label in (("0", "sync"), ("1", "async")):
+            r = results[(name, mode)]
+            print(f"{name:<24}{label:<7}{r['rps']:>9.0f}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
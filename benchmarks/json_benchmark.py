@@ -0,0 +1,127 @@
+"""
+FastAPI's response serialization vs the FAST_JSON_RESPONSES path, byte for byte.
+
+    python -m benchmarks.json_benchmark --items 100 --rounds 200
+
+Builds in-memory ORM rows for every response_model the routers use
+(nested authors, categories, tags, galleries, non-ASCII text, empty and
+null fields, search scores) and serializes each one twice: the way
+FastAPI does it (serialize_response, then JSONResponse) and through
+`cache.render`, which FastJSONRoute uses. Exits non-zero if any output
+differs; tests/test_json_compat.py runs the same comparison with the suite.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List, Union
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app import models, schemas
+from app.cache import render
+
+
+def build_rows(count: int):
+    admin = models.Role(id=1, name="admin")
+    editor = models.Role(id=2, name="éditeur")
+    users = [
+        models.User(id=i, email=f"user{i}@example.com", name=f"Ünïcødé “{i}” 作者", phone_number=None if i % 2 else "+1 555 0100",
+                    is_active=bool(i % 3), role=admin if i % 2 else editor)
+        for i in range(1, 6)
+    ]
+    categories = [models.BlogCategory(id=i, name=f"Category {i}", description=None if i % 2 else "Ponts & chaussées") for i in range(1, 4)]
+    tags = [models.BlogTag(id=i, name=f"tag-{i}", description="\"quoted\" \\ backslash </script>" if i == 1 else None) for i in range(1, 8)]
+    blogs = []
+    for i in range(1, count + 1):
+        author = users[i % len(users)]
+        blogs.append(models.Blog(
+            id=i, title=f"Post {i} — naïve café", slug=f"post-{i}", content="# Heading\n\nBody with emoji 🚧 and\ttabs\n" * 3,
+            image_url=None if i % 4 else f"/uploads/images/ab/cd/{i:064x}.jpg", status="published",
+            excerpt="Body with emoji 🚧", word_count=i * 7, reading_time_minutes=1 + i % 5,
+            content_html="<h1 id=\"heading\">Heading</h1>", toc=[{"level": 1, "id": "heading", "text": "Heading"}] if i % 2 else None,
+            author_id=author.id, author=author, category=None if i % 10 == 0 else categories[i % len(categories)],
+            tags=tags[: i % len(tags)],
+        ))
+    projects = [
+        models.Project(
+            id=i, title=f"Bridge {i}", category="Civil", location="Zürich", image_url=None, client=None if i % 2 else "City",
+            completion_date="2024-05", value="$1,200,000", description=None,
+            images=[models.ProjectImage(id=i * 10 + j, url=f"/uploads/images/{i}-{j}.jpg", position=j) for j in range(i % 6)],
+        )
+        for i in range(1, count + 1)
+    ]
+    scores = [0.0001, 0.5, 1.0, 12.3456, 3.0e-4, 123456.7891, 1e-4 * 7, 0.1 + 0.2]
+    search = {"total": count, "items": [
+        {"blog": blog, "score": round(scores[i % len(scores)], 4), "snippet": "…match…"} for i, blog in enumerate(blogs)
+    ]}
+    stats = {
+        "total_users": 5, "published_blogs": count, "draft_blogs": 0, "total_categories": 3, "total_tags": 7,
+        "posts_by_category": [{"category_id": c.id, "name": c.name, "published": 3, "draft": 1} for c in categories],
+        "posts_by_author": [{"author_id": u.id, "name": u.name, "published": 2, "draft": 0} for u in users],
+    }
+    return [
+        ("List[Blog]", List[schemas.Blog], blogs),
+        ("List[BlogSummary] | BlogPage", Union[List[schemas.BlogSummary], schemas.BlogPage], blogs),
+        ("BlogPage", Union[List[schemas.BlogSummary], schemas.BlogPage], {"items": blogs, "next_cursor": "MTIz"}),
+        ("Blog", schemas.Blog, blogs[0]),
+        ("BlogSearchResults", schemas.BlogSearchResults, search),
+        ("List[Project] | ProjectPage", Union[List[schemas.Project], schemas.ProjectPage], projects),
+        ("list[User] | UserPage", Union[list[schemas.User], schemas.UserPage], users),
+        ("List[Category]", List[schemas.Category], categories),
+        ("List[Tag]", List[schemas.Tag], tags),
+        ("List[Role]", List[schemas.Role], [admin, editor]),
+        ("DashboardStats", schemas.DashboardStats, stats),
+        ("Token", schemas.Token, {"access_token": "a.b.c", "token_type": "bearer"}),
+    ]
+
+
+def fastapi_bytes(field, data) -> bytes:
+    content = asyncio.run(serialize_response(field=field, response_content=data, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def timed(function, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="rows in each list response")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'response_model':<32}{'bytes':>9}{'FastAPI ms':>12}{'fast ms':>10}{'speedup':>9}  same")
+    for name, schema, data in build_rows(args.items):
+        field = create_model_field(name="Response", type_=schema, mode="serialization")
+        expected, actual = fastapi_bytes(field, data), render(schema, data)
+        same = expected == actual
+        mismatches += not same
+        # serialize_response is a coroutine; time it inside one loop so asyncio.run's setup isn't counted
+        async def standard():
+            for _ in range(args.rounds):
+                JSONResponse(await serialize_response(field=field, response_content=data, is_coroutine=True))
+        start = time.perf_counter()
+        asyncio.run(standard())
+        slow = (time.perf_counter() - start) / args.rounds * 1000
+        fast = timed(lambda: render(schema, data), args.rounds)
+        print(f"{name:<32}{len(expected):>9}{slow:>12.3f}{fast:>10.3f}{slow / fast:>8.1f}x  {'yes' if same else 'NO'}")
+        if not same:
+            for offset, (a, b) in enumerate(zip(expected, actual)):
+                if a != b:
+                    break
+            print(f"    first difference at byte {offset}:\n    FastAPI: {expected[max(0, offset - 40):offset + 40]!r}\n"
+                  f"    fast:    {actual[max(0, offset - 40):offset + 40]!r}")
+    if mismatches:
+        print(f"{mismatches} response models serialize differently", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
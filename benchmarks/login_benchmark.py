@@ -0,0 +1,64 @@
+"""
+Login throughput and the latency of other endpoints while logins are running.
+
+    python -m benchmarks.login_benchmark --logins 200 --login-concurrency 50
+
+Starts a uvicorn worker twice against the same seeded database: once with
+PASSWORD_HASH_WORKERS=0 (bcrypt on the request thread pool, the old
+behaviour) and once with the dedicated hasher pool. In each run a login storm
+and a steady stream of GET /blogs/{slug} requests run at the same time.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.async_load_test import drive, seed, wait_until_up
+
+
+async def run_mixed(base_url: str, args):
+    form = {"username": "bench@example.com", "password": "bench"}
+    login = drive(base_url, ["/auth/login"], {}, args.login_concurrency, args.logins, method="POST", data=form)
+    reads = drive(base_url, [f"/blogs/post-{i}" for i in range(args.posts)], {}, args.read_concurrency, args.reads)
+    return await asyncio.gather(login, reads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--read-concurrency", type=int, default=20)
+    parser.add_argument("--hash-workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    seed(database_url, args.posts)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"{'hashing':<22}{'login/s':>9}{'login p99':>11}{'rejected':>10}{'read/s':>9}{'read p50':>10}{'read p99':>10}")
+    for label, workers in (("request thread pool", 0), (f"hasher pool ({args.hash_workers})", args.hash_workers)):
+        env = dict(os.environ, DATABASE_URL=database_url, RESPONSE_CACHE_ENABLED="0", PASSWORD_HASH_WORKERS=str(workers))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            wait_until_up(base_url)
+            login, reads = asyncio.run(run_mixed(base_url, args))
+        finally:
+            server.terminate()
+            server.wait()
+        print(
+            f"{label:<22}{login['rps']:>9.1f}{login['p99']:>11.0f}{login['errors']:>10}"
+            f"{reads['rps']:>9.0f}{reads['p50']:>10.1f}{reads['p99']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Query latency of the in-memory blog search index on a generated corpus.
+
+    python -m benchmarks.search_benchmark --posts 100000
+
+Runs entirely in-process; no database is needed.
+"""
+import argparse
+import random
+import statistics
+import resource
+import time
+from itertools import accumulate
+
+from app.search import SearchIndex
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=250, help="average words per post")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    # Zipf-like weights so a few words are very common, like real text
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    tags = [f"tag{i}" for i in range(200)]
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    for blog_id in range(1, args.posts + 1):
+        body = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(args.words // 2, args.words * 3 // 2))
+        title = " ".join(rng.choices(vocabulary, cum_weights=weights, k=6))
+        index.add_document(blog_id, title, " ".join(body), rng.sample(tags, 3))
+    build_seconds = time.perf_counter() - started
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"indexed {args.posts} posts in {build_seconds:.1f}s, process max RSS {max_rss:.0f} MiB")
+
+    cases = {
+        "1 common term": lambda: rng.choice(vocabulary[:50]),
+        "1 mid term": lambda: rng.choice(vocabulary[500:5000]),
+        "2 terms": lambda: " ".join(rng.choices(vocabulary[:5000], k=2)),
+        "4 terms": lambda: " ".join(rng.choices(vocabulary[:5000], k=4)),
+    }
+    for name, make_query in cases.items():
+        timings = []
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            index.search(query, limit=20)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{name:>14}: p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms   max {timings[-1]:7.2f} ms")
+
+    updates = [" ".join(rng.choices(vocabulary, cum_weights=weights, k=args.words)) for _ in range(1000)]
+    started = time.perf_counter()
+    for blog_id, body in enumerate(updates, start=1):
+        index.add_document(blog_id, "updated title", body)
+    print(f"incremental update: {(time.perf_counter() - started):.3f} ms per post")
+
+
+if __name__ == "__main__":
+    main()
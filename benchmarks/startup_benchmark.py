@@ -0,0 +1,86 @@
+"""
+Time to first request for a fresh worker process.
+
+    python -m benchmarks.startup_benchmark --runs 10
+    python -m benchmarks.startup_benchmark --env FAST_JSON_RESPONSES=1 --path /blogs/
+
+Each run starts a new interpreter that imports app.main, runs the lifespan
+and serves one request in process, then reports the phases app.startup
+measured. `interpreter` is everything before app.main started importing
+(Python itself, site-packages, httpx). The database is a throwaway SQLite
+file whose schema already exists, unless --database-url is given.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import asyncio, json, sys, time
+import httpx
+started = time.perf_counter()
+from app.main import app
+
+async def main():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get(sys.argv[1])
+        return ready, response.status_code
+
+ready, status = asyncio.run(main())
+print(json.dumps({
+    "startup": app.state.startup, "status": status, "child_ms": (time.perf_counter() - started) * 1000,
+    "first_request_ms": (time.perf_counter() - ready) * 1000,
+}))
+"""
+
+
+def run_once(path: str, env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, path], env=env, check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    wall_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    row = {phase["phase"]: phase["ms"] for phase in result["startup"]["phases"]}
+    row["first request"] = result["first_request_ms"]
+    row["interpreter"] = wall_ms - result["child_ms"]
+    row["total"] = wall_ms
+    row["status"] = result["status"]
+    row["schema result"] = next(p.get("result") for p in result["startup"]["phases"] if p["phase"] == "schema")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/blogs/", help="the first request")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra settings for the worker")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=os.environ.get("SECRET_KEY", "startup-benchmark"))
+    env.update(item.split("=", 1) for item in args.env)
+
+    # One unmeasured run creates the schema so every measured run starts from the same database
+    run_once(args.path, env)
+    rows = [run_once(args.path, env) for _ in range(args.runs)]
+
+    print(f"{args.runs} runs, first request GET {args.path} -> {rows[0]['status']}, schema: {rows[0]['schema result']}")
+    print(f"{'phase':<16}{'median ms':>11}{'min ms':>9}{'max ms':>9}")
+    for phase in ("interpreter", "imports", "schema", "pool", "serializers", "first request", "total"):
+        values = [row[phase] for row in rows if phase in row]
+        if values:
+            print(f"{phase:<16}{statistics.median(values):>11.1f}{min(values):>9.1f}{max(values):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
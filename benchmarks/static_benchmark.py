@@ -0,0 +1,111 @@
+"""
+Static file requests per second: plain StaticFiles vs CachedStaticFiles.
+
+    python -m benchmarks.static_benchmark --concurrency 50 --requests 3000
+
+Copies a small and a large image from static/images plus a text asset
+(the app's own source, as a stand-in for a JS bundle) into a temporary
+directory, runs app.precompress on it, and serves it from a bare mount
+with each class in turn. Scenarios cover a full image fetch, a browser
+revalidation (If-None-Match), a 64 KB range of the large image and the
+text asset with Accept-Encoding: br, gzip. With `immutable`, a
+revalidation of an upload is never sent at all after the first view.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.staticfiles import StaticFiles
+
+from benchmarks.async_load_test import drive, wait_until_up
+
+SMALL_IMAGE = "static/images/0a5d0a8524ea4f749f309d93aa845d2d.jpg"
+LARGE_IMAGE = "static/images/e7dd8915185244dbaa35512acfdd0d12.jpg"
+
+
+def plain_app():
+    return Starlette(routes=[Mount("/static", StaticFiles(directory=os.environ["BENCH_STATIC_DIR"]))])
+
+
+def cached_app():
+    from app.static_files import CachedStaticFiles
+
+    return Starlette(routes=[Mount("/static", CachedStaticFiles(directory=os.environ["BENCH_STATIC_DIR"]))])
+
+
+def prepare(directory: str):
+    shutil.copy(SMALL_IMAGE, os.path.join(directory, os.path.basename(SMALL_IMAGE)))
+    shutil.copy(LARGE_IMAGE, os.path.join(directory, os.path.basename(LARGE_IMAGE)))
+    with open(os.path.join(directory, "bundle.js"), "w") as bundle:
+        for path in sorted(glob.glob("app/**/*.py", recursive=True)):
+            with open(path) as source:
+                bundle.write(source.read())
+    from app import precompress
+
+    precompress.run([directory])
+
+
+def scenarios(base_url: str):
+    small = f"/static/{os.path.basename(SMALL_IMAGE)}"
+    large = f"/static/{os.path.basename(LARGE_IMAGE)}"
+    etag = httpx.get(base_url + small).headers["etag"]
+    return {
+        "image 200 KB": (small, {}),
+        "image revalidate": (small, {"If-None-Match": etag}),
+        "4 MB image, 64 KB range": (large, {"Range": "bytes=1048576-1114111"}),
+        "bundle.js br/gzip": ("/static/bundle.js", {"Accept-Encoding": "br, gzip"}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    prepare(directory)
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for label, factory in (("StaticFiles", "plain_app"), ("Cached", "cached_app")):
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"benchmarks.static_benchmark:{factory}", "--factory",
+             "--port", str(args.port), "--log-level", "warning"],
+            env=dict(os.environ, BENCH_STATIC_DIR=directory),
+        )
+        try:
+            wait_until_up(base_url + "/static/bundle.js")
+            for name, (path, headers) in scenarios(base_url).items():
+                # The status column shows what each server answers (plain StaticFiles ignores Range)
+                response = httpx.get(base_url + path, headers=headers)
+                result = asyncio.run(drive(base_url, [path], headers, args.concurrency, args.requests, expect=(200, 206, 304)))
+                # Bytes on the wire, before httpx decompresses the body
+                result["bytes"] = int(response.headers.get("content-length", len(response.content)))
+                result["status"] = response.status_code
+                results[(name, label)] = result
+        finally:
+            server.terminate()
+            server.wait()
+    shutil.rmtree(directory)
+
+    print(f"{'scenario':<26}{'server':<13}{'status':>7}{'bytes':>10}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name in dict.fromkeys(name for name, _ in results):
+        for label in ("StaticFiles", "Cached"):
+            r = results[(name, label)]
+            print(
+                f"{name:<26}{label:<13}{r['status']:>7}{r['bytes']:>10}{r['rps']:>9.0f}"
+                f"{r['p50']:>9.1f}{r['p99']:>9.1f}{r['errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
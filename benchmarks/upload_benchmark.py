@@ -0,0 +1,92 @@
+"""
+Read latency while multi-megabyte image uploads are streaming in.
+
+    python -m benchmarks.upload_benchmark --upload-mb 8 --uploaders 4
+
+Starts a uvicorn worker on a seeded database, measures GET /blogs/{slug}
+latency on its own, then again while `--uploaders` clients post
+`--upload-mb` MB JPEG-shaped bodies back to back. If uploads blocked the
+event loop the second p50/p99 would jump by roughly the time one upload
+takes to write.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.async_load_test import drive, seed, wait_until_up
+
+
+async def upload_loop(base_url: str, headers, body: bytes, stop: asyncio.Event, results: list):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = await client.post("/upload/image/", headers=headers, files={"file": ("bench.jpg", body, "image/jpeg")})
+            results.append((response.status_code, time.perf_counter() - started))
+
+
+async def run(base_url: str, headers, args):
+    paths = [f"/blogs/post-{i}" for i in range(args.posts)]
+    idle = await drive(base_url, paths, {}, args.read_concurrency, args.reads)
+
+    body = b"\xff\xd8\xff\xe0" + os.urandom(args.upload_mb * 1024 * 1024)
+    stop = asyncio.Event()
+    uploads = []
+    uploaders = [asyncio.create_task(upload_loop(base_url, headers, body, stop, uploads)) for _ in range(args.uploaders)]
+    await asyncio.sleep(0.5)
+    busy = await drive(base_url, paths, {}, args.read_concurrency, args.reads)
+    stop.set()
+    await asyncio.gather(*uploaders)
+    return idle, busy, uploads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--read-concurrency", type=int, default=20)
+    parser.add_argument("--uploaders", type=int, default=4)
+    parser.add_argument("--upload-mb", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    token = seed(database_url, args.posts)
+    headers = {"Authorization": f"Bearer {token}"}
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ, DATABASE_URL=database_url, RESPONSE_CACHE_ENABLED="0",
+        UPLOAD_MAX_BYTES=str((args.upload_mb + 1) * 1024 * 1024),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    before = set(os.listdir("uploads/images"))
+    try:
+        wait_until_up(base_url)
+        idle, busy, uploads = asyncio.run(run(base_url, headers, args))
+    finally:
+        server.terminate()
+        server.wait()
+        # Leave the upload directory as it was
+        for name in set(os.listdir("uploads/images")) - before:
+            os.remove(os.path.join("uploads/images", name))
+
+    ok = [seconds for status, seconds in uploads if status == 200]
+    print(f"{'reads':<26}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for label, r in (("idle", idle), (f"during {args.uploaders}x{args.upload_mb} MB uploads", busy)):
+        print(f"{label:<26}{r['rps']:>9.0f}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}")
+    if ok:
+        mb_per_s = len(ok) * args.upload_mb / sum(ok) * args.uploaders
+        print(f"uploads: {len(ok)} ok, {len(uploads) - len(ok)} failed, ~{mb_per_s:.0f} MB/s aggregate")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+The FAST_JSON_RESPONSES path (cache.render, used by FastJSONRoute) must
+produce the same bytes as FastAPI's own serialization for every
+response_model the routers use. The rows come from the JSON benchmark.
+"""
+import pytest
+from fastapi.utils import create_model_field
+
+from app.cache import render
+from benchmarks.json_benchmark import build_rows, fastapi_bytes
+
+ROWS = build_rows(25)
+
+
+@pytest.mark.parametrize("schema, data", [(schema, data) for _, schema, data in ROWS], ids=[name for name, _, _ in ROWS])
+def test_fast_path_matches_fastapi(schema, data):
+    field = create_model_field(name="Response", type_=schema, mode="serialization")
+    assert render(schema, data) == fastapi_bytes(field, data)
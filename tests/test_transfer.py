@@ -0,0 +1,56 @@
+"""Exporting, importing into an empty database and exporting again gives the same records."""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.transfer import Importer, export_records
+
+
+def make_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        role = models.Role(name="admin")
+        db.add(models.User(name="Author", email="author@example.com", hashed_password="x", role=role))
+        db.commit()
+    return engine
+
+
+def seed(engine):
+    with Session(engine) as db:
+        author = db.query(models.User).one()
+        # Fewer categories than a chunk, and a tag count that leaves a described tag pending at chunk_size=2
+        bridges = models.BlogCategory(name="Bridges", description="Spans & supports")
+        steel = models.BlogTag(name="steel", description="Structural steel")
+        concrete = models.BlogTag(name="concrete")
+        timber = models.BlogTag(name="timber", description="Glulam and CLT")
+        db.add_all([bridges, steel, concrete, timber])
+        for i in range(3):
+            db.add(models.Blog(
+                title=f"Post {i}", slug=f"post-{i}", content=f"# Post {i}\n\nBody — café", status="published" if i else "draft",
+                author=author, category=bridges if i % 2 else None, tags=[timber, steel, concrete][: i + 1],
+            ))
+        db.add(models.Project(
+            title="Bridge", category="Civil", location="Zürich", client="City", completion_date="2024-05",
+            value="$1,200,000", description="Steel arch",
+            images=[models.ProjectImage(url=f"/uploads/images/{j}.jpg", position=j) for j in range(3)],
+        ))
+        db.commit()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 1000])
+def test_import_export_round_trip(tmp_path, chunk_size):
+    source = make_engine(tmp_path / "source.db")
+    seed(source)
+    exported = list(export_records(source))
+
+    target = make_engine(tmp_path / "target.db")
+    with target.connect() as connection:
+        importer = Importer(connection, chunk_size=chunk_size)
+        for record in exported:
+            importer.add(record)
+        report = importer.finish()
+
+    assert report == {"categories": 1, "tags": 3, "blogs": 3, "blogs_skipped": 0, "projects": 1, "gallery_images": 3}
+    assert list(export_records(target)) == exported